@@ -0,0 +1,771 @@
+#!/usr/bin/env python3
+import argparse
+import heapq
+import multiprocessing
+import os
+import pickle
+import random
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from simulator import Simulator, EventQueue, EventType, TaskQueue
+from planners import Planner, IncrementalPlanner
+from problems import HealthcareProblem, HealthcareElements, Element, ElementType, Resource, ResourceType
+from replications import run_replications, summarize
+from sweep import run_sweep
+from capacity import plan_capacity
+from __random__ import NaivePlanner
+from __tabusearch__ import TabusearchPlanner
+from arrivaltrace import ArrivalTrace
+
+
+class BenchmarkPlanner(Planner):
+    """
+    The naive planner from __example__.py without the event log, so that benchmarks measure the simulator and not the disk.
+    """
+    def plan(self, plannable_elements, simulation_time):
+        planned_elements = []
+        next_plannable_time = round((simulation_time + 24) * 2 + 0.5) / 2
+        for case_id, element_labels in sorted(plannable_elements.items()):
+            for element_label in element_labels:
+                planned_elements.append((case_id, element_label, next_plannable_time))
+        return planned_elements
+
+
+class BacklogPlanner(Planner):
+    """
+    Plans the plannable elements once a day, at the regular planning moment, in the order of their cases, so that a backlog builds up during the day.
+    Like NaivePlanner, it sorts all plannable elements in every pass.
+    """
+    def __init__(self):
+        super().__init__()
+        self.planning_seconds = 0
+
+    def plan(self, plannable_elements, simulation_time):
+        start = time.perf_counter()
+        planned_elements = []
+        is_planning_moment = simulation_time % 24 == 18
+        for case_id, element_labels in sorted(plannable_elements.items()):
+            for element_label in element_labels:
+                if is_planning_moment:
+                    planned_elements.append((case_id, element_label, simulation_time + 24))
+        self.planning_seconds += time.perf_counter() - start
+        return planned_elements
+
+
+class IncrementalBacklogPlanner(IncrementalPlanner):
+    """
+    The BacklogPlanner as an incremental planner, which keeps the plannable elements in a heap and only processes the changes in every pass.
+    """
+    def __init__(self):
+        super().__init__()
+        self.planning_seconds = 0
+        self.backlog = []  # heap of (case_id, element_label) that were plannable when they were added, but may no longer be
+        self.plannable = set()  # set of plannable (case_id, element_label)
+
+    def plan_changes(self, added, removed, simulation_time):
+        start = time.perf_counter()
+        for element in removed:
+            self.plannable.discard(element)
+        for element in added:
+            self.plannable.add(element)
+            heapq.heappush(self.backlog, element)
+        planned_elements = []
+        if simulation_time % 24 == 18:
+            while len(self.backlog) > 0:
+                (case_id, element_label) = heapq.heappop(self.backlog)
+                if (case_id, element_label) in self.plannable:
+                    self.plannable.remove((case_id, element_label))
+                    planned_elements.append((case_id, element_label, simulation_time + 24))
+        self.planning_seconds += time.perf_counter() - start
+        return planned_elements
+
+
+class SlotPlanner(Planner):
+    """
+    Plans each intake in the first planning slot, at least a day ahead, in which fewer intakes are planned than there are intake resources, using the slot ledger.
+    It also keeps its own list of the planned slots, as planners did before the ledger, to compare the lookups.
+    """
+    def __init__(self):
+        super().__init__()
+        self.planned_slots = []  # list of (slot, resource type) of all planned intakes
+
+    def plan(self, plannable_elements, simulation_time):
+        planned_elements = []
+        planned_now = dict()  # slot -> number of intakes planned in this pass, which are not yet in the ledger
+        capacity = self.planner_helper.resource_counts()[ResourceType.INTAKE]['total']
+        for case_id, element_labels in sorted(plannable_elements.items()):
+            for element_label in element_labels:
+                slot = self.planner_helper.next_free_planning_slot(simulation_time + 24, ResourceType.INTAKE)
+                while slot is not None and self.planner_helper.planned_count(slot, ResourceType.INTAKE) + planned_now.get(slot, 0) >= capacity:
+                    slot = self.planner_helper.next_free_planning_slot(slot + 0.5, ResourceType.INTAKE)
+                if slot is None:
+                    continue  # all slots in the coming week are full, the intake is planned at a later planning moment
+                planned_now[slot] = planned_now.get(slot, 0) + 1
+                self.planned_slots.append((slot, ResourceType.INTAKE))
+                planned_elements.append((case_id, element_label, slot))
+        return planned_elements
+
+
+class FullEvaluationTabusearchPlanner(TabusearchPlanner):
+    """
+    The tabu search planner as it was before the delta evaluation: the change in cost of a swap is computed by evaluating the whole solution
+    before and after the swap, in O(n). Used as the 'before' reference in the tabu search benchmark.
+    """
+    def swap_delta(self, solution, slots, i, j):
+        cost = self.Objfun(solution, slots)
+        self.SwapMove(solution, i, j)
+        delta = self.Objfun(solution, slots) - cost
+        self.SwapMove(solution, i, j)
+        return delta
+
+
+class SortedListEventQueue:
+    """
+    The event list as it was before the heap: a list that is sorted after every event, popped from the front and searched for cancellation.
+    Used as the 'before' reference in the event queue benchmark.
+    """
+    def __init__(self):
+        self.events = []
+        self.popped = 0
+
+    def push(self, moment, event):
+        self.events.append((moment, event))
+
+    def pop(self):
+        self.events.sort(key=lambda k: (k[0], 1 if k[1].event_type == EventType.COMPLETE_EVENT else 0))
+        self.popped += 1
+        return self.events.pop(0)
+
+    def cancel(self, case_id, element_label):
+        found_index = None
+        for i in range(len(self.events)):
+            element = self.events[i][1].element
+            if element is not None and element.case_id == case_id and element.label == element_label:
+                found_index = i
+        if found_index is not None:
+            return self.events.pop(found_index)
+        return None
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+
+class CountingEventQueue(EventQueue):
+    """
+    The heap-based event queue, counting the events that are popped.
+    """
+    def __init__(self):
+        super().__init__()
+        self.popped = 0
+
+    def pop(self):
+        self.popped += 1
+        return super().pop()
+
+
+class DictElement:
+    """
+    The element as it was before __slots__: a dict-backed object with its own data dictionary.
+    Used as the 'before' reference in the element benchmark.
+    """
+    def __init__(self, case_id, case_type, element_id, label, element_type, occurrence_time=None):
+        self.id = element_id
+        self.case_id = case_id
+        self.label = label
+        self.case_type = case_type
+        self.element_type = element_type
+        self.data = dict()
+        self.occurrence_time = occurrence_time
+        if self.is_event() and self.occurrence_time is None:
+            raise ValueError("The occurrence time of an event must be set.")
+        if self.is_task() and self.occurrence_time is not None:
+            raise ValueError("The occurrence time of a task must not be set.")
+
+    def is_event(self):
+        return self.element_type == ElementType.EVENT
+
+    def is_task(self):
+        return self.element_type == ElementType.TASK
+
+
+def legacy_assign_resources(problem, unassigned_tasks, available_resources, resource_pools):
+    """
+    HealthcareProblem.assign_resources as it was before the typed free-resource pools and waiting queues:
+    every waiting task intersects the set of all available resources with its resource pool.
+    Used as the 'before' reference in the assignment benchmark.
+    """
+    assignments = []
+    resources_to_use = set(available_resources)
+    emergency_tasks = filter(lambda k: k.case_type == 'EM', unassigned_tasks.values())
+    for emergency_task in emergency_tasks:
+        valid_resources = list(resources_to_use & set(resource_pools[problem.resource_type(emergency_task)]))
+        if valid_resources:
+            assignments.append((emergency_task, valid_resources[0]))
+            resources_to_use.remove(valid_resources[0])
+    non_emergency_tasks = filter(lambda k: k.case_type != 'EM', unassigned_tasks.values())
+    for non_emergency_task in non_emergency_tasks:
+        valid_resources = list(resources_to_use & set(resource_pools[problem.resource_type(non_emergency_task)]))
+        if valid_resources:
+            assignments.append((non_emergency_task, valid_resources[0]))
+            resources_to_use.remove(valid_resources[0])
+    return assignments
+
+
+def legacy_processing_time_sample(problem, generator, task, simulation_time):
+    """
+    HealthcareProblem.processing_time_sample as it was before the block samplers: one scalar draw from a single generator per call,
+    behind an if/elif chain on the task label and the diagnosis.
+    Used as the 'before' reference in the sampling benchmark.
+    """
+    if task.label == HealthcareElements.INTAKE:
+        return max(0, generator.normalvariate(1, 1/8))
+    elif task.label == HealthcareElements.ER_TREATMENT:
+        return max(0, generator.normalvariate(2, 1/2))
+    elif task.label == HealthcareElements.SURGERY:
+        diagnosis = problem.get_case_data(task.case_id)["diagnosis"]
+        if diagnosis == "A2":
+            return max(0, generator.normalvariate(1, 1/4))
+        elif diagnosis == "A3":
+            return max(0, generator.normalvariate(2, 1/2))
+        elif diagnosis == "A4":
+            return max(0, generator.normalvariate(4, 1/2))
+        elif diagnosis == "B3":
+            return max(0, generator.normalvariate(4, 1/2))
+        elif diagnosis == "B4":
+            return max(0, generator.normalvariate(4, 1))
+    elif task.label == HealthcareElements.NURSING:
+        diagnosis = problem.get_case_data(task.case_id)["diagnosis"]
+        if diagnosis == "A1":
+            duration = generator.normalvariate(4, 1/2)
+        elif diagnosis == "A2":
+            duration = generator.normalvariate(8, 2)
+        elif diagnosis == "A3":
+            duration = generator.normalvariate(16, 2)
+        elif diagnosis == "A4":
+            duration = generator.normalvariate(16, 2)
+        elif diagnosis == "B1":
+            duration = generator.normalvariate(8, 2)
+        elif diagnosis == "B2":
+            duration = generator.normalvariate(16, 2)
+        elif diagnosis == "B3":
+            duration = generator.normalvariate(16, 4)
+        elif diagnosis == "B4":
+            duration = generator.normalvariate(16, 4)
+        nursing_finish_time = simulation_time + max(0, duration)
+        return problem.next_release_time(nursing_finish_time) - simulation_time
+
+
+def legacy_next_release_time(current_time):
+    """
+    HealthcareProblem.next_release_time as it was before the calendar index.
+    Used, like legacy_is_planning_slot, as the 'before' reference in the calendar benchmark.
+    """
+    release_times = [8, 13, 18]
+    if current_time % 72 <= max(release_times):
+        # release today
+        valid_release_offsets = filter(lambda k : k >= 0,
+                               [release_time - (current_time % 72) for release_time in release_times]
+        )
+        return current_time + min(valid_release_offsets)
+    else:
+        # release next day
+        return current_time + (72 - current_time % 72) + min(release_times)
+
+
+def legacy_is_planning_slot(time):
+    time_in_week = time % (24 * 7)
+    hour_of_day_x_10 = round((time_in_week % 24)*10)  # we multiply by 10 to avoid floating point errors
+    day_of_week = True
+    return hour_of_day_x_10 >= 80 and hour_of_day_x_10 <= 150 and day_of_week < 5 and hour_of_day_x_10 % 5 == 0
+
+
+def run_simulation(queue, hours, seed, configuration=None):
+    """
+    Runs the simulation with the given event queue and returns (number of processed events, wall time in seconds).
+    """
+    simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=seed, configuration=configuration))
+    while len(simulator.events) > 0:
+        (moment, event) = simulator.events.pop()
+        queue.push(moment, event)
+    simulator.events = queue
+    start = time.perf_counter()
+    simulator.run(hours)
+    return queue.popped, time.perf_counter() - start
+
+
+def benchmark_event_queue(args):
+    print("event queue, " + str(args.hours) + " simulated hours, seed " + str(args.seed))
+    for name, queue_class in [("sorted list (before)", SortedListEventQueue), ("binary heap (after)", CountingEventQueue)]:
+        events, seconds = run_simulation(queue_class(), args.hours, args.seed)
+        print(f"{name:<22}{events:>10} events{seconds:>10.2f} s{events / seconds:>12.0f} events/s")
+
+
+def run_scaled_simulation(scale, hours, seed):
+    """
+    Runs the simulation of a hospital with scale times the resources and arrivals
+    and returns (number of resources, number of processed events, wall time in seconds, peak memory of the process in MB).
+    Must run in a fresh process, because the peak memory is that of the process.
+    """
+    import resource  # only available on Unix
+    configuration = HealthcareProblem.scale_configuration(resources=scale, arrivals=scale)
+    events, seconds = run_simulation(CountingEventQueue(), hours, seed, configuration)
+    return sum(configuration["resources"].values()), events, seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark_scaling(args):
+    print("hospital scaled in resources and arrivals, " + str(args.hours) + " simulated hours, seed " + str(args.seed))
+    for scale in args.scales:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            resources, events, seconds, peak_memory = executor.submit(run_scaled_simulation, scale, args.hours, args.seed).result()
+        print(f"{scale:>6g}x{resources:>7} resources{events:>10} events{seconds:>10.2f} s{events / seconds:>10.0f} events/s{peak_memory:>10.1f} MB peak")
+
+
+def benchmark_resource_counts(args):
+    simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=args.seed))
+    simulator.run(args.hours)
+    planner_helper = simulator.planner.planner_helper
+    print("number of available resources of each type after " + str(args.hours) + " simulated hours")
+
+    def count_available_resources():
+        counts = dict()
+        for resource in planner_helper.available_resources():
+            counts[resource.type] = counts.get(resource.type, 0) + 1
+        return counts
+
+    for name, query in [("available_resources (before)", count_available_resources), ("resource_counts (after)", planner_helper.resource_counts)]:
+        start = time.perf_counter()
+        for _ in range(args.count):
+            query()
+        seconds = time.perf_counter() - start
+        print(f"{name:<30}{seconds / args.count * 1e6:>8.2f} us per query")
+
+
+def benchmark_snapshot(args):
+    simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=args.seed))
+    simulator.run(args.hours)
+    planner_helper = simulator.planner.planner_helper
+    snapshot = planner_helper.snapshot()
+    print("state snapshot after " + str(args.hours) + " simulated hours: " + str(sum(len(tasks) for tasks in snapshot.waiting_tasks.values())) + " waiting tasks, "
+          + str(len(snapshot.busy_resources)) + " busy resources, " + str(len(snapshot.pending_events)) + " cases with planned events")
+    start = time.perf_counter()
+    for _ in range(args.count):
+        planner_helper.snapshot()
+    seconds = time.perf_counter() - start
+    print(f"{'snapshot':<22}{seconds / args.count * 1e6:>10.1f} us per snapshot")
+
+
+def benchmark_plan_changes(args):
+    print("planning once a day, " + str(args.arrivals) + " times the arrivals, " + str(args.hours) + " simulated hours, seed " + str(args.seed))
+    configuration = HealthcareProblem.scale_configuration(arrivals=args.arrivals)
+    results = []
+    for name, planner in [("all plannable elements (before)", BacklogPlanner()), ("changes only (after)", IncrementalBacklogPlanner())]:
+        simulator = Simulator(planner, HealthcareProblem(seed=args.seed, configuration=configuration))
+        start = time.perf_counter()
+        results.append(simulator.run(args.hours))
+        seconds = time.perf_counter() - start
+        print(f"{name:<34}{planner.planning_seconds:>8.2f} s planning{seconds:>8.2f} s total")
+    print("same results" if results[0] == results[1] else "DIFFERENT RESULTS")
+
+
+def benchmark_slots(args):
+    results = dict()
+    for name, planner in [("naive planner", BenchmarkPlanner()), ("slot planner", SlotPlanner())]:
+        simulator = Simulator(planner, HealthcareProblem(seed=args.seed))
+        results[name] = simulator.run(args.hours)
+        print(f"{name:<22}" + "  ".join(f"{key} {value:.1f}" for key, value in results[name].items()))
+    planner_helper = planner.planner_helper
+    slots = [simulator.next_planning_slot(simulator.now + hours / 2) for hours in range(48)]
+    print("number of intakes planned in a slot, with " + str(len(planner.planned_slots)) + " intakes planned so far")
+    for name, count in [("own list (before)", lambda slot: planner.planned_slots.count((slot, ResourceType.INTAKE))),
+                        ("slot ledger (after)", lambda slot: planner_helper.planned_count(slot, ResourceType.INTAKE))]:
+        start = time.perf_counter()
+        for _ in range(args.count):
+            for slot in slots:
+                count(slot)
+        seconds = time.perf_counter() - start
+        print(f"{name:<22}{seconds / args.count / len(slots) * 1e6:>10.2f} us per query")
+
+
+def benchmark_tabu(args):
+    print("tabu search iterations over all swaps of n patients, " + str(args.iterations) + " iterations")
+    for count in [25, 50, 100]:
+        generator = random.Random(args.seed)
+        referral_times = {case_id: generator.uniform(0, 7 * 24) for case_id in range(count)}
+        slots = sorted(generator.choice(range(7 * 24, 14 * 24)) / 2 for _ in range(count))
+        elements = [(case_id, HealthcareElements.TIME_FOR_INTAKE) for case_id in range(count)]
+        generator.shuffle(elements)
+        costs = []
+        line = f"n={count:<5}"
+        for name, planner_class in [("full evaluation (before)", FullEvaluationTabusearchPlanner), ("O(1) delta (after)", TabusearchPlanner)]:
+            planner = planner_class(time_budget=float("inf"), max_iterations=args.iterations, patience=args.iterations, candidate_moves=count * count)
+            planner.referral_times = referral_times
+            start = time.perf_counter()
+            best_solution = planner.search(list(elements), slots, float("inf"))
+            seconds = time.perf_counter() - start
+            costs.append(planner.Objfun(best_solution, slots))
+            line += f"{name:>26}{seconds / args.iterations * 1e3:>10.3f} ms/iteration"
+        print(line + ("" if abs(costs[0] - costs[1]) < 1e-6 * costs[0] else "  DIFFERENT SOLUTIONS"))
+    print("scores and longest planning moment, " + str(args.hours) + " simulated hours, seed " + str(args.seed) + ", time budget " + str(args.budget) + " s")
+    for name, planner in [("slot planner", SlotPlanner()),
+                          ("tabu search", TabusearchPlanner(time_budget=args.budget, seed=args.seed)),
+                          ("tabu search at 18:00", TabusearchPlanner(time_budget=args.budget, planning_hour=18, seed=args.seed))]:
+        plan = planner.plan
+        longest = [0, 0]  # longest planning moment in seconds, largest number of planned elements
+
+        def timed_plan(plannable_elements, simulation_time, plan=plan, longest=longest):
+            start = time.perf_counter()
+            planned_elements = plan(plannable_elements, simulation_time)
+            longest[0] = max(longest[0], time.perf_counter() - start)
+            longest[1] = max(longest[1], len(planned_elements))
+            return planned_elements
+        planner.plan = timed_plan
+        result = Simulator(planner, HealthcareProblem(seed=args.seed)).run(args.hours)
+        print(f"{name:<22}" + "  ".join(f"{key} {value:.1f}" for key, value in result.items())
+              + f"  longest plan {longest[0] * 1e3:.1f} ms for {longest[1]} patients")
+
+
+def benchmark_coalesce(args):
+    print("coalescing of ASSIGN_RESOURCES and PLAN_EVENTS passes, " + str(args.hours) + " simulated hours, seed " + str(args.seed))
+    for coalesce in [False, True]:
+        simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=args.seed), coalesce=coalesce)
+        start = time.perf_counter()
+        simulator.run(args.hours)
+        seconds = time.perf_counter() - start
+        saved = simulator.coalesced_passes()
+        print(f"{'coalesce' if coalesce else 'no coalesce':<14}{seconds:>8.2f} s"
+              f"{saved.get(EventType.ASSIGN_RESOURCES, 0):>10} assignment passes saved"
+              f"{saved.get(EventType.PLAN_EVENTS, 0):>10} planning passes saved")
+
+
+def create_elements(element_class, count, **kwargs):
+    """
+    Creates count task elements, five per case.
+    """
+    return [element_class(i // 5, "A", i, HealthcareElements.NURSING, ElementType.TASK, **kwargs) for i in range(count)]
+
+
+def benchmark_elements(args):
+    print("memory and construction time of " + str(args.count) + " elements")
+    case_data = {"diagnosis": "A1"}
+    for name, element_class, kwargs in [("dict-backed (before)", DictElement, {}), ("slots, shared data (after)", Element, {"data": case_data})]:
+        start = time.perf_counter()
+        create_elements(element_class, args.count, **kwargs)
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        elements = create_elements(element_class, args.count, **kwargs)
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{name:<28}{allocated / args.count:>8.0f} bytes/element{seconds / args.count * 1e9:>8.0f} ns/element")
+        del elements
+
+
+def benchmark_assign(args):
+    print("assignment pass with " + str(args.waiting) + " waiting nursing tasks per bed, " + str(args.repeat) + " passes")
+    problem = HealthcareProblem(seed=args.seed)
+    operating_room = Resource(ResourceType.OR, "OR1")
+    for scale in [1, 5, 20]:
+        resource_pools = {
+            ResourceType.A_BED: [Resource(ResourceType.A_BED, "A_BED" + str(i)) for i in range(1, 30 * scale + 1)],
+            ResourceType.B_BED: [Resource(ResourceType.B_BED, "B_BED" + str(i)) for i in range(1, 40 * scale + 1)],
+            ResourceType.OR: [operating_room]
+        }
+        unassigned_tasks = dict()
+        waiting_tasks = {ResourceType.A_BED: TaskQueue(), ResourceType.B_BED: TaskQueue(), ResourceType.OR: TaskQueue()}
+        for i in range((len(resource_pools[ResourceType.A_BED]) + len(resource_pools[ResourceType.B_BED])) * args.waiting + 1):
+            label = HealthcareElements.SURGERY if i == 0 else HealthcareElements.NURSING
+            problem.case_data[i] = {"diagnosis": "A1" if i % 2 == 0 else "B1"}
+            task = Element(i, "EM" if i % 10 == 0 else "A", i, label, ElementType.TASK, data=problem.case_data[i])
+            unassigned_tasks[i] = task
+            waiting_tasks[problem.resource_type(task)].add(task, problem.task_priority(task), i)
+        # all beds free and, as the worst case for a single flat queue, only the operating room free
+        for name, free_types in [("all beds free", [ResourceType.A_BED, ResourceType.B_BED]), ("one OR free", [ResourceType.OR])]:
+            available_resources = {resource for resource_type in free_types for resource in resource_pools[resource_type]}
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                legacy_assign_resources(problem, unassigned_tasks, available_resources, resource_pools)
+            legacy_seconds = (time.perf_counter() - start) / args.repeat
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                problem.assign_resources(waiting_tasks, {resource_type: dict.fromkeys(resources) if resource_type in free_types else dict() for resource_type, resources in resource_pools.items()})
+            typed_seconds = (time.perf_counter() - start) / args.repeat
+            print(f"{scale:>4}x beds {name:<14}{len(unassigned_tasks):>8} tasks"
+                  f"{legacy_seconds * 1e3:>10.3f} ms flat queue (before){typed_seconds * 1e3:>10.3f} ms typed queues (after)"
+                  f"{legacy_seconds / typed_seconds:>10.1f}x")
+
+
+def benchmark_sampling(args):
+    print("processing time of " + str(args.count) + " tasks of all labels and diagnoses")
+    problem = HealthcareProblem(seed=args.seed)
+    tasks = []
+    for i, (label, diagnosis) in enumerate(problem.processing_times):
+        problem.case_data[i] = {"diagnosis": diagnosis}
+        tasks.append(Element(i, "A", i, label, ElementType.TASK, data=problem.case_data[i]))
+    tasks = [tasks[i % len(tasks)] for i in range(args.count)]
+    generator = random.Random(args.seed)
+    start = time.perf_counter()
+    for task in tasks:
+        legacy_processing_time_sample(problem, generator, task, 0)
+    legacy_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for task in tasks:
+        problem.processing_time_sample(None, task, 0)
+    block_seconds = time.perf_counter() - start
+    print(f"{'scalar draws (before)':<24}{legacy_seconds / args.count * 1e9:>8.0f} ns/sample")
+    print(f"{'block sampler (after)':<24}{block_seconds / args.count * 1e9:>8.0f} ns/sample{legacy_seconds / block_seconds:>8.2f}x")
+
+
+def benchmark_calendar(args):
+    print("calendar questions for " + str(args.count) + " times, half of them on whole or half hours")
+    generator = random.Random(args.seed)
+    times = [generator.uniform(0, 24 * 365) if i % 2 == 0 else generator.randrange(0, 2 * 24 * 365) / 2 for i in range(args.count)]
+    simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=args.seed))
+    problem = simulator.problem
+    for name, legacy, indexed in [
+        ("next_release_time", legacy_next_release_time, problem.next_release_time),
+        ("is_planning_slot", legacy_is_planning_slot, simulator.is_planning_slot)
+    ]:
+        start = time.perf_counter()
+        legacy_answers = [legacy(t) for t in times]
+        legacy_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        indexed_answers = [indexed(t) for t in times]
+        indexed_seconds = time.perf_counter() - start
+        print(f"{name:<26}{legacy_seconds / args.count * 1e9:>8.0f} ns modulo (before){indexed_seconds / args.count * 1e9:>8.0f} ns calendar (after)"
+              f"{legacy_seconds / indexed_seconds:>8.2f}x  {'same answers' if legacy_answers == indexed_answers else 'DIFFERENT ANSWERS'}")
+
+
+def benchmark_checkpoint(args):
+    simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=args.seed), keep_history=args.keep_history)
+    simulator.run(args.hours)
+    print("checkpoint after " + str(args.hours) + " simulated hours, " + str(len(simulator.events)) + " queued events, "
+          + str(len(simulator.problem.case_data)) + " cases" + (", with history" if args.keep_history else ""))
+    pickle_file = args.file + ".pickle"
+    checkpoint_file = args.file + ".checkpoint"
+    start = time.perf_counter()
+    simulator.problem.save(pickle_file)
+    pickle_save_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    HealthcareProblem.from_file(pickle_file)
+    pickle_load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    simulator.save_checkpoint(checkpoint_file)
+    checkpoint_save_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    Simulator.from_checkpoint(checkpoint_file, BenchmarkPlanner())
+    checkpoint_load_seconds = time.perf_counter() - start
+    for name, file_name, save_seconds, load_seconds in [("Problem.save (before)", pickle_file, pickle_save_seconds, pickle_load_seconds),
+                                                        ("save_checkpoint (after)", checkpoint_file, checkpoint_save_seconds, checkpoint_load_seconds)]:
+        print(f"{name:<26}{os.path.getsize(file_name) / 1e6:>8.2f} MB{save_seconds:>8.2f} s save{load_seconds:>8.2f} s load")
+        os.remove(file_name)
+
+
+def benchmark_trace(args):
+    trace_file = args.file + ".trace"
+    start = time.perf_counter()
+    count = ArrivalTrace.write(trace_file, HealthcareProblem(seed=args.seed).generate_arrivals(args.hours))
+    write_seconds = time.perf_counter() - start
+    trace = ArrivalTrace(trace_file)
+    print(f"arrival trace of {args.hours} simulated hours, {count} cases, {os.path.getsize(trace_file) / 1e6:.2f} MB, written in {write_seconds:.2f} s")
+    for name, read in [("list of tuples", lambda: list(trace)), ("memory-mapped trace", lambda: sum(1 for _ in trace))]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        read()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:<22}{peak / 1e6:>10.2f} MB peak{seconds:>8.2f} s to read all cases")
+    results = dict()
+    for name, problem in [("sampled arrivals", HealthcareProblem(seed=args.seed)), ("replayed arrivals", HealthcareProblem(seed=args.seed, arrival_trace=trace))]:
+        simulator = Simulator(BenchmarkPlanner(), problem)
+        start = time.perf_counter()
+        results[name] = simulator.run(args.run_hours)
+        print(f"{name:<22}{time.perf_counter() - start:>10.2f} s for {args.run_hours} simulated hours")
+    print("same results" if results["sampled arrivals"] == results["replayed arrivals"] else "DIFFERENT RESULTS")
+    trace.close()
+    os.remove(trace_file)
+
+
+def benchmark_replications(args):
+    processes = args.processes if args.processes is not None else os.cpu_count()
+    print(str(args.replications) + " replications of " + str(args.hours) + " simulated hours")
+    timings = dict()
+    for workers in sorted({1, processes}):
+        start = time.perf_counter()
+        results = run_replications(BenchmarkPlanner, args.replications, args.hours, seed=args.seed, processes=workers)
+        timings[workers] = time.perf_counter() - start
+        print(f"{workers:>4} processes{timings[workers]:>10.2f} s{timings[1] / timings[workers]:>8.2f}x speedup")
+    for key, statistics in summarize(results).items():
+        print(f"{key:<22} mean {statistics['mean']:>10.2f}  std {statistics['std']:>10.2f}  95% CI [{statistics['ci_low']:.2f}, {statistics['ci_high']:.2f}]")
+
+
+def benchmark_sweep(args):
+    grid = {"max_replan": args.max_replan}
+    print("sweep of NaivePlanner over " + str(grid) + ", " + str(args.replications) + " replications of " + str(args.hours) + " simulated hours")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name in ["empty cache", "cached results"]:
+            start = time.perf_counter()
+            results = run_sweep(NaivePlanner, grid, args.replications, args.hours, seed=args.seed, cache_dir=cache_dir, processes=args.processes)
+            print(f"{name:<22}{time.perf_counter() - start:>10.2f} s")
+    for point, point_results in results:
+        print(f"{str(point):<22} mean processed_score {summarize(point_results)['processed_score']['mean']:>10.2f}")
+
+
+def benchmark_capacity(args):
+    candidates = {"A_BED": args.a_beds, "B_BED": args.b_beds}
+    targets = {"sent_home_score": args.sent_home_score}
+    candidate_count = len(args.a_beds) * len(args.b_beds)
+    print("cheapest beds among " + str(candidates) + " with " + str(targets) + ", " + str(args.hours) + " simulated hours per replication")
+    equal_replications = args.budget // candidate_count
+    for name, initial_replications, budget in [("equal allocation", equal_replications, equal_replications * candidate_count), ("OCBA", args.initial_replications, args.budget)]:
+        start = time.perf_counter()
+        result = plan_capacity(BenchmarkPlanner, candidates, targets, running_time=args.hours, initial_replications=initial_replications,
+                               budget=budget, seed=args.seed, processes=args.processes)
+        seconds = time.perf_counter() - start
+        answer = None if result["resources"] is None else {resource_type: result["resources"][resource_type] for resource_type in candidates}
+        print(f"{name:<18}{result['replications']:>6} replications{seconds:>8.2f} s  {'confident' if result['confident'] else 'not confident'}  {answer}")
+
+
+def benchmark_fork(args):
+    simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=args.seed))
+    simulator.run(args.hours)
+    print("fork after " + str(args.hours) + " simulated hours, " + str(len(simulator.events)) + " queued events, " + str(len(simulator.busy_cases)) + " busy cases")
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        simulator.fork(BenchmarkPlanner())
+    fork_seconds = (time.perf_counter() - start) / args.repeat
+    start = time.perf_counter()
+    pickle.loads(pickle.dumps(simulator.problem, protocol=pickle.HIGHEST_PROTOCOL))
+    pickle_seconds = time.perf_counter() - start
+    print(f"{'Simulator.fork':<22}{fork_seconds * 1e6:>12.0f} us")
+    print(f"{'pickle round trip':<22}{pickle_seconds * 1e6:>12.0f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the simulator.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    event_queue_parser = subparsers.add_parser("event_queue", help="events/sec of Simulator.run with the old sorted list and the heap")
+    event_queue_parser.add_argument("--hours", type=float, default=30 * 24)
+    event_queue_parser.add_argument("--seed", type=int, default=1)
+    event_queue_parser.set_defaults(func=benchmark_event_queue)
+
+    scaling_parser = subparsers.add_parser("scaling", help="wall time, events/sec and peak memory of Simulator.run for a hospital scaled 1x, 10x and 100x")
+    scaling_parser.add_argument("--hours", type=float, default=7 * 24)
+    scaling_parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100])
+    scaling_parser.add_argument("--seed", type=int, default=1)
+    scaling_parser.set_defaults(func=benchmark_scaling)
+
+    resource_counts_parser = subparsers.add_parser("resource_counts", help="time per query of the number of resources of each type with available_resources and with the resource counts")
+    resource_counts_parser.add_argument("--hours", type=float, default=30 * 24)
+    resource_counts_parser.add_argument("--count", type=int, default=20000)
+    resource_counts_parser.add_argument("--seed", type=int, default=1)
+    resource_counts_parser.set_defaults(func=benchmark_resource_counts)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="time to take a read-only snapshot of the simulation state for a planner")
+    snapshot_parser.add_argument("--hours", type=float, default=30 * 24)
+    snapshot_parser.add_argument("--count", type=int, default=2000)
+    snapshot_parser.add_argument("--seed", type=int, default=1)
+    snapshot_parser.set_defaults(func=benchmark_snapshot)
+
+    plan_changes_parser = subparsers.add_parser("plan_changes", help="time spent planning with a backlog when the planner gets all plannable elements and when it gets only the changes")
+    plan_changes_parser.add_argument("--hours", type=float, default=30 * 24)
+    plan_changes_parser.add_argument("--arrivals", type=float, default=20)
+    plan_changes_parser.add_argument("--seed", type=int, default=1)
+    plan_changes_parser.set_defaults(func=benchmark_plan_changes)
+
+    slots_parser = subparsers.add_parser("slots", help="scores with a naive and a slot-aware planner and time per planned-in-slot query with a list and with the slot ledger")
+    slots_parser.add_argument("--hours", type=float, default=30 * 24)
+    slots_parser.add_argument("--count", type=int, default=200)
+    slots_parser.add_argument("--seed", type=int, default=1)
+    slots_parser.set_defaults(func=benchmark_slots)
+
+    tabu_parser = subparsers.add_parser("tabu", help="time per tabu search iteration with full and with delta evaluation of swaps, and scores of the tabu search planner within a time budget")
+    tabu_parser.add_argument("--iterations", type=int, default=20)
+    tabu_parser.add_argument("--hours", type=float, default=90 * 24)
+    tabu_parser.add_argument("--budget", type=float, default=0.05)
+    tabu_parser.add_argument("--seed", type=int, default=1)
+    tabu_parser.set_defaults(func=benchmark_tabu)
+
+    coalesce_parser = subparsers.add_parser("coalesce", help="redundant assignment and planning passes saved by coalescing")
+    coalesce_parser.add_argument("--hours", type=float, default=30 * 24)
+    coalesce_parser.add_argument("--seed", type=int, default=1)
+    coalesce_parser.set_defaults(func=benchmark_coalesce)
+
+    elements_parser = subparsers.add_parser("elements", help="memory per element and construction time of elements")
+    elements_parser.add_argument("--count", type=int, default=200000)
+    elements_parser.set_defaults(func=benchmark_elements)
+
+    assign_parser = subparsers.add_parser("assign", help="time of an assignment pass with a flat task queue and with typed waiting queues and free-resource pools")
+    assign_parser.add_argument("--waiting", type=int, default=4)
+    assign_parser.add_argument("--repeat", type=int, default=20)
+    assign_parser.add_argument("--seed", type=int, default=1)
+    assign_parser.set_defaults(func=benchmark_assign)
+
+    sampling_parser = subparsers.add_parser("sampling", help="time per processing time sample with scalar draws and with the block samplers")
+    sampling_parser.add_argument("--count", type=int, default=500000)
+    sampling_parser.add_argument("--seed", type=int, default=1)
+    sampling_parser.set_defaults(func=benchmark_sampling)
+
+    calendar_parser = subparsers.add_parser("calendar", help="time per question of the working time, shift change, release time and planning slot functions with and without the calendar index")
+    calendar_parser.add_argument("--count", type=int, default=200000)
+    calendar_parser.add_argument("--seed", type=int, default=1)
+    calendar_parser.set_defaults(func=benchmark_calendar)
+
+    checkpoint_parser = subparsers.add_parser("checkpoint", help="size and save and load time of a pickled problem and of a binary checkpoint")
+    checkpoint_parser.add_argument("--hours", type=float, default=365 * 24)
+    checkpoint_parser.add_argument("--keep-history", action="store_true")
+    checkpoint_parser.add_argument("--file", default="benchmark")
+    checkpoint_parser.add_argument("--seed", type=int, default=1)
+    checkpoint_parser.set_defaults(func=benchmark_checkpoint)
+
+    trace_parser = subparsers.add_parser("trace", help="size of an arrival trace, memory to read it, and a simulation with sampled and with replayed arrivals")
+    trace_parser.add_argument("--hours", type=float, default=10 * 365 * 24)
+    trace_parser.add_argument("--run-hours", type=float, default=30 * 24)
+    trace_parser.add_argument("--file", default="benchmark")
+    trace_parser.add_argument("--seed", type=int, default=1)
+    trace_parser.set_defaults(func=benchmark_trace)
+
+    replications_parser = subparsers.add_parser("replications", help="scaling of parallel replications with the number of processes")
+    replications_parser.add_argument("--replications", type=int, default=8)
+    replications_parser.add_argument("--hours", type=float, default=30 * 24)
+    replications_parser.add_argument("--processes", type=int, default=None)
+    replications_parser.add_argument("--seed", type=int, default=1)
+    replications_parser.set_defaults(func=benchmark_replications)
+
+    sweep_parser = subparsers.add_parser("sweep", help="time of a parameter sweep with an empty cache and with all results cached")
+    sweep_parser.add_argument("--max-replan", type=int, nargs="+", default=[48, 96, 168])
+    sweep_parser.add_argument("--replications", type=int, default=4)
+    sweep_parser.add_argument("--hours", type=float, default=30 * 24)
+    sweep_parser.add_argument("--processes", type=int, default=None)
+    sweep_parser.add_argument("--seed", type=int, default=1)
+    sweep_parser.set_defaults(func=benchmark_sweep)
+
+    capacity_parser = subparsers.add_parser("capacity", help="replications to find the cheapest bed capacity that meets a target with equal allocation and with OCBA")
+    capacity_parser.add_argument("--a-beds", type=int, nargs="+", default=[10, 15, 20, 25, 30])
+    capacity_parser.add_argument("--b-beds", type=int, nargs="+", default=[30, 40])
+    capacity_parser.add_argument("--sent-home-score", type=float, default=920)
+    capacity_parser.add_argument("--hours", type=float, default=30 * 24)
+    capacity_parser.add_argument("--initial-replications", type=int, default=10)
+    capacity_parser.add_argument("--budget", type=int, default=200)
+    capacity_parser.add_argument("--processes", type=int, default=None)
+    capacity_parser.add_argument("--seed", type=int, default=1)
+    capacity_parser.set_defaults(func=benchmark_capacity)
+
+    fork_parser = subparsers.add_parser("fork", help="cost of forking a running simulator compared to a pickle round trip")
+    fork_parser.add_argument("--hours", type=float, default=30 * 24)
+    fork_parser.add_argument("--repeat", type=int, default=100)
+    fork_parser.add_argument("--seed", type=int, default=1)
+    fork_parser.set_defaults(func=benchmark_fork)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
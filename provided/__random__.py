@@ -8,15 +8,23 @@ from reporter import EventLogReporter
 
 
 class NaivePlanner(Planner):
-    def __init__(self, eventlog_file, data_columns):
+    def __init__(self, eventlog_file=None, data_columns=(), min_replan=25, max_replan=168):
+        """
+        :param eventlog_file: the file to which the event log is written, or None to not write an event log, e.g. in a parameter sweep.
+        :param min_replan: the minimum number of hours after the planning moment at which an element is planned.
+        :param max_replan: the maximum number of hours after the planning moment at which an element is planned.
+        """
         super().__init__()
-        self.eventlog_reporter = EventLogReporter(eventlog_file, data_columns)
+        self.eventlog_reporter = EventLogReporter(eventlog_file, data_columns) if eventlog_file is not None else None
         self.planned_patients = set()
+        self.min_replan = min_replan
+        self.max_replan = max_replan
 
     def report(self, case_id, element, timestamp, resource, lifecycle_state):
-        self.eventlog_reporter.callback(
-            case_id, element, timestamp, resource, lifecycle_state
-        )
+        if self.eventlog_reporter is not None:
+            self.eventlog_reporter.callback(
+                case_id, element, timestamp, resource, lifecycle_state
+            )
 
     def plan(self, plannable_elements, simulation_time):
         planned_elements = []
@@ -24,15 +32,16 @@ class NaivePlanner(Planner):
         for case_id, element_labels in sorted(plannable_elements.items()):
             for element_label in element_labels:
                 next_plannable_time = round(
-                    simulation_time + random.randint(25, 168)
-                )  # improved random replan between 25h and 1 week
+                    simulation_time + random.randint(self.min_replan, self.max_replan)
+                )  # improved random replan, by default between 25h and 1 week
                 planned_elements.append((case_id, element_label, next_plannable_time))
         return planned_elements
 
 
-planner = NaivePlanner("./temp/event_log.csv", ["diagnosis"])
-problem = HealthcareProblem()
-simulator = Simulator(planner, problem)
-result = simulator.run(365 * 24)
+if __name__ == "__main__":
+    planner = NaivePlanner("./temp/event_log.csv", ["diagnosis"])
+    problem = HealthcareProblem()
+    simulator = Simulator(planner, problem)
+    result = simulator.run(365 * 24)
 
-print(result)
+    print(result)
@@ -1,153 +1,222 @@
 #!/usr/bin/env python3
+import math
 import random as rd
+import time
 
 from simulator import Simulator
 from planners import Planner
-from problems import HealthcareProblem, ResourceType
+from problems import HealthcareElements, HealthcareProblem, ResourceType
 from reporter import EventLogReporter
 from simulator import EventType
 
 
 class TabusearchPlanner(Planner):
-    def __init__(self, eventlog_file, data_columns, tabu_tenure=10):
+    """
+    Plans the TIME_FOR_INTAKE of patients in planning slots at least a day ahead with tabu search.
+    A solution assigns the patients to the free places in the first planning slots on working days, in the order of the places,
+    where the number of free places in a slot is the slot capacity minus the number of intakes that are already planned in it.
+    The cost of a solution is the sum of the costs of the patients, see get_cost, so the change in cost of swapping two patients
+    only depends on those two patients and is computed in O(1), without evaluating the whole solution.
+    Each iteration makes the best swap among at most candidate_moves swaps, which are all swaps if there are few patients and random swaps otherwise.
+    A swap of the same two patients is tabu for tabu_tenure iterations, unless it leads to a solution that is better than the best so far (aspiration).
+    The search stops after max_iterations iterations, after patience iterations without improvement, or when the time budget of the planning moment is spent,
+    which is also checked while the candidate swaps of an iteration are evaluated.
+    """
+    # the cost of a patient doubles with every WAIT_SCALE hours of waiting
+    WAIT_SCALE = 24
+    # the cost of a patient who is planned after they leave due to long wait
+    LEFT_COST = 1000
+
+    def __init__(self, eventlog_file=None, data_columns=(), tabu_tenure=10, time_budget=0.05, max_iterations=1000, patience=100,
+                 candidate_moves=500, slot_capacity=None, planning_hour=None, seed=None):
+        """
+        :param tabu_tenure: the number of iterations during which a swap of the same two patients is tabu.
+        :param time_budget: the maximum time in seconds that the search takes at a planning moment.
+        :param max_iterations: the maximum number of iterations at a planning moment.
+        :param patience: the number of iterations without improvement after which the search stops.
+        :param candidate_moves: the maximum number of swaps that is evaluated per iteration.
+        :param slot_capacity: the number of intakes that can be planned in a planning slot, by default the number of intake resources. It must be positive.
+        :param planning_hour: if not None, patients are only planned at this hour of the day, e.g. 18, so that the search plans them together.
+        :param seed: the seed of the random candidate swaps. If None, it is drawn from the random module, so that seeding the random module reproduces the plans.
+        """
         super().__init__()
-        self.eventlog_reporter = EventLogReporter(eventlog_file, data_columns)
-        self.planned_patients = set()
-        # stores patients
-        self.instance_dict = {}
-        # stores number resources that are currently in use
-        self.used_resources = self.init_resource_dict()
-        # stores the number of patients waiting for a resource by resource type
-        self.resource_queues = self.init_resource_dict()
+        if slot_capacity is not None and slot_capacity <= 0:
+            raise ValueError("The slot capacity must be positive, but it is " + str(slot_capacity) + ".")
+        # no event log is written if eventlog_file is None, e.g. in a parameter sweep
+        self.eventlog_reporter = EventLogReporter(eventlog_file, data_columns) if eventlog_file is not None else None
         self.tabu_tenure = tabu_tenure
+        self.time_budget = time_budget
+        self.max_iterations = max_iterations
+        self.patience = patience
+        self.candidate_moves = candidate_moves
+        self.slot_capacity = slot_capacity
+        self.planning_hour = planning_hour
+        self.random = rd.Random(rd.random() if seed is None else seed)
+        self.referral_times = dict()  # case_id -> time of the referral, after which the patient leaves if they wait too long
+        self.plan_counts = dict()  # case_id -> number of times that the TIME_FOR_INTAKE of the case was planned
 
     def report(self, case_id, element, timestamp, resource, lifecycle_state):
-        self.eventlog_reporter.callback(
-            case_id, element, timestamp, resource, lifecycle_state
-        )
-
-        self.instance_dict[case_id] = (
-            element,
-            timestamp,
-            resource,
-            lifecycle_state,
-        )
-
-        if lifecycle_state == EventType.ACTIVATE_TASK:
-            if resource:
-                self.resource_queues[resource.type] += 1
-        elif lifecycle_state == EventType.START_TASK:
-            if resource:
-                self.resource_queues[resource.type] -= 1
-                self.used_resources[resource.type] += 1
-        elif lifecycle_state == EventType.COMPLETE_TASK:
-            if resource:
-                self.used_resources[resource.type] -= 1
+        if self.eventlog_reporter is not None:
+            self.eventlog_reporter.callback(
+                case_id, element, timestamp, resource, lifecycle_state
+            )
+
+        if lifecycle_state == EventType.COMPLETE_EVENT and element.label == HealthcareElements.PATIENT_REFERAL:
+            self.referral_times[case_id] = timestamp
         elif lifecycle_state == EventType.COMPLETE_CASE:
-            self.instance_dict.pop(case_id)
-            pass
+            self.referral_times.pop(case_id, None)
+            self.plan_counts.pop(case_id, None)
 
     def plan(self, plannable_elements, simulation_time):
-        tenure = self.tabu_tenure
-        tabu_list = self.get_tabu_list()
-
-        current_solution = self.get_initial_solution(plannable_elements)
-        best_solution = self.get_initial_solution(plannable_elements)
-        best_cost = self.get_cost(best_solution)
-        
-
-        Terminate = 0
-        while Terminate < 100:
-
-            for move in tabu_list:
-                candidate_solution = self.SwapMove(current_solution, move[0], move[1])
-                candidate_cost = self.get_cost(candidate_solution)
-                tabu_list[move]["MoveValue"] = candidate_cost
-
-            while True:
-                best_move = min(tabu_list, key=lambda x: tabu_list[x]["MoveValue"])
-                MoveValue = tabu_list[best_move]["MoveValue"]
-                tabu_time = tabu_list[best_move]["tabu_time"]
-
-                if tabu_time < iter:
-                    current_solution = self.SwapMove(
-                        current_solution, best_move[0], best_move[1]
-                    )
-                    current_cost = self.Objfun(current_solution)
-
-                    if MoveValue < best_cost:
-                        best_solution = current_solution
-                        best_cost = current_cost
-                        print(
-                            "   best_move: {}, Cost: {} => Best Improving => Admissible".format(
-                                best_move, current_cost
-                            )
-                        )
-                        Terminate = 0
-                    else:
-                        print(
-                            "   ##Termination: {}## best_move: {}, Cost: {} => Least non-improving => "
-                            "Admissible".format(Terminate, best_move, current_cost)
-                        )
-                        Terminate += 1
-
-                    tabu_list[best_move]["tabu_time"] = iter + tenure
-                    iter += 1
-                    break
-                else:
-                    if MoveValue < best_cost:
-
-                        current_solution = self.SwapMove(
-                            current_solution, best_move[0], best_move[1]
-                        )
-                        current_cost = self.Objfun(current_solution)
-                        best_solution = current_solution
-                        best_cost = current_cost
-                        print(
-                            "   best_move: {}, Cost: {} => Aspiration => Admissible".format(
-                                best_move, current_cost
-                            )
-                        )
-                        Terminate = 0
-                        iter += 1
-                        break
-                    else:
-                        tabu_list[best_move]["MoveValue"] = float("inf")
-                        print(
-                            "   best_move: {}, Cost: {} => Tabu => Inadmissible".format(
-                                best_move, current_cost
-                            )
-                        )
-                        continue
-
+        if self.planning_hour is not None and round(simulation_time % 24, 6) != self.planning_hour:
+            return []
+        stop_time = time.perf_counter() + self.time_budget
+        elements = [(case_id, element_label) for case_id, element_labels in sorted(plannable_elements.items()) for element_label in element_labels]
+        if len(elements) == 0:
+            return []
+        for case_id, _ in elements:
+            # a case that was referred before the planner was attached, e.g. to a fork, is taken to be referred now
+            self.referral_times.setdefault(case_id, simulation_time)
+        slots = self.get_slots(simulation_time, len(elements))
+        if len(slots) == 0:
+            return []
+        solution = self.search(self.get_initial_solution(elements), slots, stop_time)
+        planned_elements = []
+        for (case_id, element_label), slot in zip(solution, slots):
+            self.plan_counts[case_id] = self.plan_counts.get(case_id, 0) + 1
+            planned_elements.append((case_id, element_label, slot))
         return planned_elements
 
-    def init_resource_dict(self):
+    def get_slots(self, simulation_time, count):
+        """
+        Returns the first count free places in planning slots in which intake staff is on duty, at least a day after the simulation time, in order of time.
+        Each place is the time of its slot, so a slot with several free places occurs several times.
+        Returns an empty list if there is no intake staff or the slots of a whole week are full, so that the patients are planned at a later planning moment.
+        """
+        capacity = self.slot_capacity
+        if capacity is None:
+            capacity = self.planner_helper.resource_counts().get(ResourceType.INTAKE, {'total': 0})['total']
+            if capacity == 0:
+                return []
+        slots = []
+        slot = self.planner_helper.next_free_planning_slot(simulation_time + 24, ResourceType.INTAKE, capacity)
+        while len(slots) < count:
+            if slot is None:
+                return []
+            if self.planner_helper.resource_type_available(ResourceType.INTAKE, slot):
+                free = capacity - self.planner_helper.planned_count(slot, ResourceType.INTAKE)
+                slots.extend([slot] * min(free, count - len(slots)))
+            slot = self.planner_helper.next_free_planning_slot(slot + 0.5, ResourceType.INTAKE, capacity)
+        return slots
+
+    def get_initial_solution(self, elements):
+        """
+        :return: list of the elements in order of referral, i.e. the first patient gets the first place
+        """
+        return sorted(elements, key=lambda element: self.referral_times[element[0]])
+
+    def get_tabu_list(self):
         """
-        :return: dict of all resources with initial values set to 0
+        :return: dict of move -> last iteration in which the move is tabu, where a move is the pair of case ids that are swapped, smallest first
         """
-        resource_dict = {}
-        for resource in ResourceType:
-            resource_dict[resource.name] = 0
-        return resource_dict
+        return dict()
 
-    def get_initial_solution(self, plannable_elements):
+    def get_cost(self, element, slot):
         """
-        :return: dict of random initial solution
-        Convert to list and back to shuffle correct
-        since we delete completed instances so not all keys are there
+        Returns the cost of planning a patient in a slot, which grows exponentially with the time since the referral
+        and is multiplied by the number of times that the patient was planned before, because patients who were sent home weigh more.
         """
-        instances = list(plannable_elements.items())
-        rd.shuffle(instances)
-        return dict(instances)
+        case_id = element[0]
+        referral_time = self.referral_times[case_id]
+        weight = 1 + self.plan_counts.get(case_id, 0)
+        if slot >= referral_time + 7*24:
+            return weight * self.LEFT_COST
+        return weight * 2 ** ((slot - referral_time) / self.WAIT_SCALE)
+
+    def Objfun(self, solution, slots):
+        """
+        :return: the cost of a solution, in O(n)
+        """
+        return sum(self.get_cost(element, slot) for element, slot in zip(solution, slots))
 
+    def swap_delta(self, solution, slots, i, j):
+        """
+        :return: the change in the cost of the solution when the patients in places i and j are swapped, in O(1)
+        """
+        return self.get_cost(solution[i], slots[j]) + self.get_cost(solution[j], slots[i]) \
+            - self.get_cost(solution[i], slots[i]) - self.get_cost(solution[j], slots[j])
 
-planner = TabusearchPlanner("./temp/tabu_event_log.csv", ["diagnosis"])
-problem = HealthcareProblem()
-simulator = Simulator(planner, problem)
-result = simulator.run(1 * 24)
+    def SwapMove(self, solution, i, j):
+        """
+        Swaps the patients in places i and j of the solution, in place.
+        """
+        solution[i], solution[j] = solution[j], solution[i]
 
-print(result)
+    def get_candidate_moves(self, count):
+        """
+        :return: iterator of (i, j) places to swap, all pairs if there are at most candidate_moves of them and random pairs otherwise
+        """
+        if count * (count - 1) // 2 <= self.candidate_moves:
+            for i in range(count - 1):
+                for j in range(i + 1, count):
+                    yield (i, j)
+        else:
+            for _ in range(self.candidate_moves):
+                i = self.random.randrange(count - 1)
+                yield (i, self.random.randrange(i + 1, count))
+
+    def search(self, solution, slots, stop_time):
+        """
+        Improves the solution with tabu search until an iteration, patience or time limit is reached.
+        :return: the best solution that was found
+        """
+        tabu_list = self.get_tabu_list()
+        current_cost = best_cost = self.Objfun(solution, slots)
+        best_solution = list(solution)
+        iteration = 0
+        without_improvement = 0
+        while len(solution) > 1 and iteration < self.max_iterations and without_improvement < self.patience and time.perf_counter() < stop_time:
+            best_move = None
+            best_delta = math.inf
+            out_of_time = False
+            for evaluated, (i, j) in enumerate(self.get_candidate_moves(len(solution)), 1):
+                if evaluated % 16 == 0 and time.perf_counter() >= stop_time:
+                    out_of_time = True
+                    break
+                if slots[i] == slots[j]:
+                    continue
+                delta = self.swap_delta(solution, slots, i, j)
+                if delta >= best_delta:
+                    continue
+                (a, b) = (solution[i][0], solution[j][0])
+                move = (a, b) if a < b else (b, a)
+                if tabu_list.get(move, -1) >= iteration and current_cost + delta >= best_cost:
+                    continue
+                best_move = (i, j, move)
+                best_delta = delta
+            if best_move is None or out_of_time:
+                break
+            (i, j, move) = best_move
+            self.SwapMove(solution, i, j)
+            current_cost += best_delta
+            tabu_list[move] = iteration + self.tabu_tenure
+            iteration += 1
+            if current_cost < best_cost:
+                best_cost = current_cost
+                best_solution = list(solution)
+                without_improvement = 0
+            else:
+                without_improvement += 1
+        return best_solution
+
+
+if __name__ == "__main__":
+    planner = TabusearchPlanner("./temp/tabu_event_log.csv", ["diagnosis"])
+    problem = HealthcareProblem()
+    simulator = Simulator(planner, problem)
+    result = simulator.run(365 * 24)
+
+    print(result)
 
 # print(self.planner_helper.available_resources()[1])
 
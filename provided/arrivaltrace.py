@@ -0,0 +1,115 @@
+"""
+Arrival traces: files with the arrival time, case type and diagnosis of every case of a simulation, see HealthcareProblem.
+
+A trace is generated once with HealthcareProblem.generate_arrivals, or imported from a CSV file with read_csv, and written with ArrivalTrace.write.
+A problem that is created with an arrival trace replays the cases of the trace instead of sampling them,
+so that many planners can be evaluated on exactly the same demand.
+The file is memory-mapped and read one record at a time, so traces with millions of cases are not held in memory.
+
+The file consists of a header with the number of cases and the position of the names of the case types and diagnoses,
+followed by one fixed-size record of (arrival time, case type code, diagnosis code) per case, in the order of arrival,
+followed by the names as a JSON document. The code of no diagnosis is -1.
+"""
+import csv
+import json
+import mmap
+import struct
+
+MAGIC = b"SIMTRACE"
+VERSION = 1
+HEADER = struct.Struct("<IQQ")  # version, number of cases, position of the names
+RECORD = struct.Struct("<dhh")  # arrival time, case type code, diagnosis code
+RECORDS_START = len(MAGIC) + HEADER.size
+
+
+class ArrivalTrace:
+    """
+    A read-only, memory-mapped arrival trace. Cases are accessed by their index in the trace, i.e. the order of arrival.
+    A trace can be shared by any number of problems.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as handle:
+            self.map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(filename + " is not an arrival trace file.")
+        (version, self.count, names_start) = HEADER.unpack_from(self.map, len(MAGIC))
+        if version != VERSION:
+            raise ValueError("Arrival trace version " + str(version) + " is not supported, the supported version is " + str(VERSION) + ".")
+        names = json.loads(self.map[names_start:])
+        self.case_types = names["case_types"]  # list of the case types, indexed by their code
+        self.diagnoses = names["diagnoses"]  # list of the diagnoses, indexed by their code
+
+    @staticmethod
+    def write(filename, arrivals):
+        """
+        Writes an arrival trace.
+        :param arrivals: an iterable of (arrival time, case type, diagnosis or None) tuples in the order of arrival, which is consumed while it is written.
+        :return: the number of cases that were written.
+        """
+        case_types = dict()  # case type -> code
+        diagnoses = dict()  # diagnosis -> code
+        count = 0
+        previous_time = None
+        with open(filename, "wb") as handle:
+            handle.write(MAGIC)
+            handle.write(HEADER.pack(VERSION, 0, 0))
+            records = bytearray()
+            for (arrival_time, case_type, diagnosis) in arrivals:
+                if previous_time is not None and arrival_time < previous_time:
+                    raise ValueError("The arrivals are not in the order of arrival: case " + str(count) + " arrives at " + str(arrival_time) + ", before the previous case at " + str(previous_time) + ".")
+                previous_time = arrival_time
+                diagnosis_code = -1 if diagnosis is None else diagnoses.setdefault(diagnosis, len(diagnoses))
+                records += RECORD.pack(arrival_time, case_types.setdefault(case_type, len(case_types)), diagnosis_code)
+                count += 1
+                if len(records) >= 1 << 16:
+                    handle.write(records)
+                    records.clear()
+            handle.write(records)
+            names_start = handle.tell()
+            handle.write(json.dumps({"case_types": list(case_types), "diagnoses": list(diagnoses)}).encode())
+            handle.seek(len(MAGIC))
+            handle.write(HEADER.pack(VERSION, count, names_start))
+        return count
+
+    @staticmethod
+    def read_csv(filename):
+        """
+        Reads the arrivals from a CSV file with the columns arrival_time, case_type and diagnosis, where an empty diagnosis means no diagnosis,
+        e.g. to import a trace from a hospital information system.
+        :return: an iterator of (arrival time, case type, diagnosis or None) tuples that can be passed to write.
+        """
+        with open(filename, newline="") as file:
+            for row in csv.DictReader(file):
+                yield (float(row["arrival_time"]), row["case_type"], row["diagnosis"] or None)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        """
+        Returns the (arrival time, case type, diagnosis or None) of the case with the given index.
+        """
+        if not 0 <= index < self.count:
+            raise IndexError("Arrival trace index out of range")
+        (arrival_time, case_type_code, diagnosis_code) = RECORD.unpack_from(self.map, RECORDS_START + index * RECORD.size)
+        return (arrival_time, self.case_types[case_type_code], None if diagnosis_code == -1 else self.diagnoses[diagnosis_code])
+
+    def __iter__(self):
+        case_types = self.case_types
+        diagnoses = self.diagnoses
+        # records are unpacked from the map by offset, so that no view of the map outlives a consumer that stops iterating early,
+        # which would keep the map from being closed
+        for offset in range(RECORDS_START, RECORDS_START + self.count * RECORD.size, RECORD.size):
+            (arrival_time, case_type_code, diagnosis_code) = RECORD.unpack_from(self.map, offset)
+            yield (arrival_time, case_types[case_type_code], None if diagnosis_code == -1 else diagnoses[diagnosis_code])
+
+    def close(self):
+        self.map.close()
+
+    def __getstate__(self):
+        # the memory map cannot be pickled, so the trace is opened again from its file
+        return {"filename": self.filename}
+
+    def __setstate__(self, state):
+        self.__init__(state["filename"])
@@ -0,0 +1,165 @@
+import copy
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import mean, stdev
+
+from problems import HealthcareProblem
+from replications import run_replication, summarize, t_quantile
+from sweep import expand_grid
+
+
+def plan_capacity(planner_factory, candidates, targets, costs=None, running_time=365*24, initial_replications=10, budget=200, batch_size=None,
+                  confidence=0.95, seed=0, configuration=None, processes=None):
+    """
+    Searches for the cheapest number of resources with which the mean scores of a planner meet the given targets.
+    Replications are allocated adaptively, in the style of optimal computing budget allocation (OCBA) for feasibility:
+    after initial_replications for every candidate, each batch of replications goes to the candidates that can still be the answer,
+    i.e. that are not more expensive than the cheapest candidate that meets the targets so far, in proportion to (standard deviation / (target - mean))^2
+    of their closest metric. Close calls thereby get most replications and clear cases few.
+    The search stops when the budget is spent or when every candidate that can still be the answer meets or misses the targets with the given confidence.
+    Replication i of every candidate is seeded with seed + i, so candidates are compared on the same arrivals, case types and diagnoses.
+    :param planner_factory: a picklable callable without arguments that returns a new planner, e.g. a planner class.
+    :param candidates: a dictionary of resource type -> list of numbers of resources of that type to consider, e.g. {"A_BED": [25, 30, 35]}.
+        Every combination is a candidate, see sweep.expand_grid. Resource types that are not in it keep the number of the configuration.
+    :param targets: a dictionary of key of HealthcareProblem.evaluate() -> the maximum mean score, where lower scores are better.
+    :param costs: a dictionary of resource type -> cost of one resource of that type. By default every resource costs 1.
+    :param running_time: the simulated time in hours of each replication.
+    :param initial_replications: the number of replications of every candidate before replications are allocated adaptively, at least 2.
+    :param budget: the maximum total number of replications, including the initial ones, which must fit in it.
+    :param batch_size: the number of replications that is allocated at a time, by default the number of processes.
+    :param confidence: the confidence with which a candidate must meet or miss the targets for the search to stop early.
+    :param seed: the seed of the first replication.
+    :param configuration: the configuration of the hospital of which the numbers of resources are varied. If None, HealthcareProblem.CONFIGURATION is used.
+    :param processes: the number of worker processes, by default the number of CPUs.
+    :return: a dictionary with the numbers of resources of the cheapest candidate that meets the targets as 'resources', or None if no candidate meets them,
+        its 'cost', its 'summary' as returned by replications.summarize, whether the search was 'confident' about the answer, the number of 'replications' that were run,
+        and per candidate in order of cost, the 'candidates' as dictionaries with 'resources', 'cost', 'replications', 'means' and whether it is 'feasible'.
+    """
+    if initial_replications < 2:
+        raise ValueError("At least 2 initial replications are needed to estimate the variance of the scores.")
+    configuration = HealthcareProblem.CONFIGURATION if configuration is None else configuration
+    base_resources = HealthcareProblem.merge_resource_counts(configuration.get("resources", dict()))
+    costs = dict() if costs is None else costs
+    designs = []  # list of dictionaries with the 'resources', 'cost', 'configuration' and 'results' of each candidate, in order of cost
+    for point in expand_grid(candidates):
+        resources = dict(base_resources)
+        resources.update(point)
+        design_configuration = copy.deepcopy(configuration)
+        design_configuration["resources"] = resources
+        designs.append({
+            "resources": resources,
+            "cost": sum(count * costs.get(resource_type, 1) for resource_type, count in resources.items()),
+            "configuration": design_configuration,
+            "results": []
+        })
+    designs.sort(key=lambda design: design["cost"])
+    if len(designs) * initial_replications > budget:
+        raise ValueError("The budget of " + str(budget) + " replications does not cover the " + str(initial_replications) + " initial replications of each of the "
+                         + str(len(designs)) + " candidates.")
+    if processes is None:
+        processes = os.cpu_count()
+    if batch_size is None:
+        batch_size = processes
+    executor = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+    try:
+        used = run_batch(executor, planner_factory, running_time, seed, [design for design in designs for _ in range(initial_replications)])
+        while True:
+            statistics = [design_statistics(design, targets, confidence) for design in designs]
+            answer = next((i for i, design_stats in enumerate(statistics) if design_stats["feasible"]), None)
+            relevant = [i for i in range(len(designs)) if answer is None or designs[i]["cost"] <= designs[answer]["cost"]]
+            confident = all(statistics[i]["confident"] for i in relevant)
+            if confident or used >= budget:
+                break
+            allocation = allocate(relevant, statistics, min(batch_size, budget - used))
+            used += run_batch(executor, planner_factory, running_time, seed, [designs[i] for i in allocation])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return {
+        "resources": None if answer is None else designs[answer]["resources"],
+        "cost": None if answer is None else designs[answer]["cost"],
+        "summary": None if answer is None else summarize(designs[answer]["results"]),
+        "confident": confident,
+        "replications": used,
+        "candidates": [{
+            "resources": design["resources"],
+            "cost": design["cost"],
+            "replications": len(design["results"]),
+            "means": design_stats["means"],
+            "feasible": design_stats["feasible"]
+        } for design, design_stats in zip(designs, statistics)]
+    }
+
+
+def run_batch(executor, planner_factory, running_time, seed, designs):
+    """
+    Runs one more replication for each occurrence of a candidate in designs, in parallel if there is an executor, and adds the results to the candidates.
+    :return: the number of replications that were run.
+    """
+    seeds = []
+    offsets = dict()  # dictionary of id(design) -> number of replications of the design in this batch so far
+    for design in designs:
+        offset = offsets.get(id(design), 0)
+        seeds.append(seed + len(design["results"]) + offset)
+        offsets[id(design)] = offset + 1
+    configurations = [design["configuration"] for design in designs]
+    if executor is None:
+        results = [run_replication(planner_factory, s, running_time, c) for s, c in zip(seeds, configurations)]
+    else:
+        results = executor.map(run_replication, [planner_factory] * len(designs), seeds, [running_time] * len(designs), configurations)
+    for design, result in zip(designs, results):
+        design["results"].append(result)
+    return len(designs)
+
+
+def design_statistics(design, targets, confidence):
+    """
+    Returns the number of 'replications' and the 'means' of the scores of a candidate, whether it is 'feasible', i.e. its means meet the targets,
+    whether that is known with the given 'confident'-ce, and the OCBA 'weight' of the metric of which it is the least certain whether it meets the target.
+    """
+    results = design["results"]
+    n = len(results)
+    critical_value = t_quantile(confidence, n - 1)
+    means = dict()
+    feasible = True
+    confident = True
+    weight = 0
+    for key, target in targets.items():
+        values = [result[key] for result in results]
+        means[key] = mean(values)
+        deviation = stdev(values)
+        gap = target - means[key]
+        if gap < 0:
+            feasible = False
+        if gap == 0:
+            weight = math.inf
+            confident = False
+        elif deviation > 0:
+            weight = max(weight, (deviation / gap) ** 2)
+            if abs(gap) * math.sqrt(n) / deviation < critical_value:
+                confident = False
+    return {"replications": n, "means": means, "feasible": feasible, "confident": confident, "weight": weight}
+
+
+def allocate(relevant, statistics, count):
+    """
+    Allocates count replications to the relevant candidates, one at a time to the candidate of which the number of replications is furthest below
+    its share of all replications of the relevant candidates, where the share of a candidate is proportional to its OCBA weight.
+    :return: a list of the indices of the candidates, with one occurrence per allocated replication.
+    """
+    weights = {i: statistics[i]["weight"] for i in relevant}
+    if math.inf in weights.values():
+        weights = {i: 1 if weight == math.inf else 0 for i, weight in weights.items()}
+    total_weight = sum(weights.values())
+    if total_weight == 0:
+        weights = {i: 1 for i in relevant}
+        total_weight = len(relevant)
+    replications = {i: statistics[i]["replications"] for i in relevant}
+    total = sum(replications.values()) + count
+    allocation = []
+    for _ in range(count):
+        i = max(relevant, key=lambda i: weights[i] / total_weight * total - replications[i])
+        replications[i] += 1
+        allocation.append(i)
+    return allocation
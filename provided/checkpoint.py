@@ -0,0 +1,199 @@
+"""
+A compact, versioned binary format for checkpoints of the full state of a simulation, see Simulator.save_checkpoint and Simulator.from_checkpoint.
+
+A checkpoint file is a sequence of named sections. A section is either a column, i.e. an array of numbers of a single type,
+or a JSON document for small and irregular state. Tables, such as the event queue or the case data, are stored column by column.
+Elements are stored once, in the element table, and are referred to by their row in that table.
+Resources are referred to by their index in the resources of the problem.
+"""
+import array
+import importlib
+import json
+import math
+import struct
+from enum import Enum
+
+MAGIC = b"SIMCKPT\n"
+VERSION = 2
+
+
+def class_path(cls):
+    return cls.__module__ + "." + cls.__qualname__
+
+
+def load_class(path):
+    (module_name, _, class_name) = path.rpartition(".")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def encode_value(value):
+    """
+    Encodes a value as JSON, keeping the class of enum members, which do not survive a JSON round trip otherwise.
+    """
+    if isinstance(value, Enum):
+        return {"enum": class_path(type(value)), "value": value.value}
+    return value
+
+
+def decode_value(value, enum_classes):
+    if isinstance(value, dict) and "enum" in value:
+        if value["enum"] not in enum_classes:
+            enum_classes[value["enum"]] = load_class(value["enum"])
+        return enum_classes[value["enum"]](value["value"])
+    return value
+
+
+class CheckpointWriter:
+    """
+    Collects the sections of a checkpoint and writes them to a file.
+    """
+    def __init__(self):
+        self.sections = dict()  # dictionary of section name -> (kind, typecode, payload)
+        self.elements = []  # the rows of the element table
+        self.element_rows = dict()  # dictionary of id(element) -> row of the element in the element table
+
+    def column(self, name, typecode, values):
+        """
+        Adds a column of numbers with the given array typecode.
+        """
+        self.sections[name] = (b"a", typecode.encode(), array.array(typecode, values).tobytes())
+
+    def numbers(self, name, values):
+        """
+        Adds a column of floats, e.g. moments, that can also contain ints. The rows with ints are kept, so they are restored as ints.
+        """
+        values = list(values)
+        self.column(name, "d", values)
+        self.column(name + "/integers", "q", [row for row, value in enumerate(values) if isinstance(value, int)])
+
+    def document(self, name, value):
+        """
+        Adds a JSON document.
+        """
+        self.sections[name] = (b"j", b" ", json.dumps(value).encode())
+
+    def coded(self, name, values):
+        """
+        Adds a column of values that have few distinct values, e.g. labels or types, as a column of codes and a document with the distinct values.
+        The code of None is -1.
+        """
+        codes = dict()
+        column = []
+        for value in values:
+            if value is None:
+                column.append(-1)
+            else:
+                column.append(codes.setdefault(value, len(codes)))
+        self.document(name + "/values", [encode_value(value) for value in codes])
+        self.column(name, "i", column)
+
+    def element_row(self, element):
+        """
+        Returns the row of the element in the element table, adding it if needed, or -1 for None.
+        """
+        if element is None:
+            return -1
+        row = self.element_rows.get(id(element))
+        if row is None:
+            row = len(self.elements)
+            self.element_rows[id(element)] = row
+            self.elements.append(element)
+        return row
+
+    def write(self, filename, case_data):
+        """
+        Writes the element table and all sections to the file.
+        :param case_data: the case data of the problem, to check which elements share the data of their case.
+        """
+        elements = self.elements
+        self.column("element/id", "q", [element.id for element in elements])
+        self.column("element/case_id", "q", [element.case_id for element in elements])
+        self.coded("element/label", [element.label for element in elements])
+        self.coded("element/case_type", [element.case_type for element in elements])
+        self.coded("element/element_type", [element.element_type for element in elements])
+        self.numbers("element/occurrence_time", [math.nan if element.occurrence_time is None else element.occurrence_time for element in elements])
+        # 1 if the element shares the data of its case, 0 if it has its own empty data, e.g. because its case has no data yet
+        shares_case_data = [element.data is case_data.get(element.case_id) for element in elements]
+        self.column("element/case_data", "b", [1 if shared else 0 for shared in shares_case_data])
+        for element, shared in zip(elements, shares_case_data):
+            if not shared and len(element.data) > 0:
+                raise ValueError("The data of element " + str(element.id) + " is not the data of its case and cannot be checkpointed.")
+        with open(filename, "wb") as handle:
+            handle.write(MAGIC)
+            handle.write(struct.pack("<II", VERSION, len(self.sections)))
+            for name, (kind, typecode, payload) in self.sections.items():
+                encoded_name = name.encode()
+                handle.write(struct.pack("<H", len(encoded_name)))
+                handle.write(encoded_name)
+                handle.write(kind + typecode)
+                handle.write(struct.pack("<Q", len(payload)))
+                handle.write(payload)
+
+
+class CheckpointReader:
+    """
+    Reads the sections of a checkpoint file.
+    """
+    def __init__(self, filename):
+        with open(filename, "rb") as handle:
+            content = handle.read()
+        if content[:len(MAGIC)] != MAGIC:
+            raise ValueError(filename + " is not a checkpoint file.")
+        position = len(MAGIC)
+        (version, section_count) = struct.unpack_from("<II", content, position)
+        position += 8
+        if version != VERSION:
+            raise ValueError("Checkpoint version " + str(version) + " is not supported, the supported version is " + str(VERSION) + ".")
+        self.sections = dict()  # dictionary of section name -> (kind, typecode, payload)
+        view = memoryview(content)
+        for _ in range(section_count):
+            (name_length,) = struct.unpack_from("<H", content, position)
+            position += 2
+            name = bytes(view[position:position + name_length]).decode()
+            position += name_length
+            kind = content[position:position + 1]
+            typecode = content[position + 1:position + 2].decode()
+            position += 2
+            (length,) = struct.unpack_from("<Q", content, position)
+            position += 8
+            self.sections[name] = (kind, typecode, view[position:position + length])
+            position += length
+        self.enum_classes = dict()  # dictionary of class path -> enum class, for decoding
+        self.elements = None
+
+    def is_column(self, name):
+        return self.sections[name][0] == b"a"
+
+    def column(self, name):
+        (kind, typecode, payload) = self.sections[name]
+        values = array.array(typecode)
+        values.frombytes(payload)
+        return values
+
+    def numbers(self, name):
+        values = list(self.column(name))
+        for row in self.column(name + "/integers"):
+            values[row] = int(values[row])
+        return values
+
+    def document(self, name):
+        return json.loads(bytes(self.sections[name][2]))
+
+    def coded(self, name):
+        values = [decode_value(value, self.enum_classes) for value in self.document(name + "/values")]
+        return [None if code == -1 else values[code] for code in self.column(name)]
+
+    def read_elements(self, element_class, case_data):
+        """
+        Restores the element table, in which the elements share the restored data of their case.
+        """
+        columns = zip(self.column("element/id"), self.column("element/case_id"), self.coded("element/label"), self.coded("element/case_type"),
+                      self.coded("element/element_type"), self.numbers("element/occurrence_time"), self.column("element/case_data"))
+        self.elements = []
+        for (element_id, case_id, label, case_type, element_type, occurrence_time, shares_case_data) in columns:
+            self.elements.append(element_class(case_id, case_type, element_id, label, element_type,
+                                               occurrence_time=None if isinstance(occurrence_time, float) and math.isnan(occurrence_time) else occurrence_time,
+                                               data=case_data[case_id] if shares_case_data else None))
+
+    def element(self, row):
+        return None if row == -1 else self.elements[row]
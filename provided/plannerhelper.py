@@ -1,3 +1,28 @@
+from types import MappingProxyType
+
+
+class StateSnapshot:
+    """
+    A read-only copy of the state of the simulation at a moment, as returned by PlannerHelper.snapshot.
+    It does not change when the simulation continues. The elements and resources in it are shared with the simulation.
+    """
+    __slots__ = ("now", "waiting_tasks", "busy_resources", "patients_after_intake", "pending_events", "resource_counts")
+
+    def __init__(self, now, waiting_tasks, busy_resources, patients_after_intake, pending_events, resource_counts):
+        object.__setattr__(self, "now", now)  # the moment of the snapshot
+        object.__setattr__(self, "waiting_tasks", waiting_tasks)  # resource type -> tuple of the tasks that wait for a resource of that type, in the order in which they get one
+        object.__setattr__(self, "busy_resources", busy_resources)  # resource -> (task, moment the task started) for the resources that work on a task
+        object.__setattr__(self, "patients_after_intake", patients_after_intake)  # tuple of the case ids of the patients that had intake, but no surgery or nursing yet
+        object.__setattr__(self, "pending_events", pending_events)  # case id -> tuple of (element label, planned moment) of the events that are planned for the case, by moment
+        object.__setattr__(self, "resource_counts", resource_counts)  # resource type -> numbers of 'free', 'busy', 'away' and 'total' resources, see PlannerHelper.resource_counts
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A state snapshot is read-only.")
+
+    def __delattr__(self, name):
+        raise AttributeError("A state snapshot is read-only.")
+
+
 class PlannerHelper:
     """
     A helper class for the planner to access information that is useful for planning.
@@ -11,10 +36,9 @@ class PlannerHelper:
 
     def available_resources(self):
         """
-        Returns the number of resources of a specific type that are available.
-        Possible types are "OR", "A_BED", "B_BED".
-        :param resource_type: the type of resources to check for availability.
-        :return: the number of available resources.
+        Returns the list of resources that are available, i.e. on duty, whether they are idle or busy.
+        This checks every resource of the problem, use the resource counts below to only get the number of resources of a type.
+        :return: the list of available resources.
         """
 
         res = []
@@ -23,6 +47,92 @@ class PlannerHelper:
                 res.append(resource)
         return res
 
+    def free_resource_count(self, resource_type):
+        """
+        Returns the number of resources of the given type that are available and idle, in O(1).
+        """
+        return self.__simulator.resource_counts(resource_type)[0]
+
+    def busy_resource_count(self, resource_type):
+        """
+        Returns the number of resources of the given type that are assigned to a task, in O(1).
+        """
+        return self.__simulator.resource_counts(resource_type)[1]
+
+    def away_resource_count(self, resource_type):
+        """
+        Returns the number of resources of the given type that are off duty and idle, in O(1).
+        """
+        return self.__simulator.resource_counts(resource_type)[2]
+
+    def resource_counts(self):
+        """
+        Returns the numbers of free, busy and away resources of each type.
+        :return: a new dictionary of resource type -> dictionary with the numbers of 'free', 'busy' and 'away' resources and the 'total' number of resources of that type.
+        """
+        counts = dict()
+        for resource_type, total in self.__simulator.resource_totals.items():
+            (free, busy, away) = self.__simulator.resource_counts(resource_type)
+            counts[resource_type] = {'free': free, 'busy': busy, 'away': away, 'total': total}
+        return counts
+
+    def plannable_elements(self):
+        """
+        Returns a read-only view of the elements that can currently be planned, which is the dictionary of case_id -> list of element labels
+        that is passed to Planner.plan. Incremental planners can use it to see all plannable elements, rather than only the changes.
+        The view reflects the current state, so it changes when the simulation continues. The lists in it must not be changed.
+        """
+        return MappingProxyType(self.__problem.can_plan)
+
+    def planned_count(self, time, resource_type):
+        """
+        Returns the number of events that are planned at the given time and claim a resource of the given type, e.g. TIME_FOR_INTAKE events for INTAKE, in O(1).
+        """
+        return self.__problem.planned_count(time, resource_type)
+
+    def next_free_planning_slot(self, time, resource_type, capacity=None):
+        """
+        Returns the first planning slot at or after the given time in which fewer than capacity events are planned that claim a resource of the given type,
+        or None if all slots in the week from the given time are full.
+        :param capacity: the number of events that can be planned in a slot, by default the number of resources of the type. It must be positive.
+        """
+        return self.__problem.next_free_planning_slot(time, resource_type, capacity)
+
+    def resource_type_available(self, resource_type, time):
+        """
+        Returns whether resources of the given type are on duty at the given time, e.g. whether intakes can take place in a planning slot.
+        """
+        return self.__problem.resource_type_available(resource_type, time)
+
+    def waiting_task_count(self, resource_type):
+        """
+        Returns the number of tasks that wait for a resource of the given type, in O(1).
+        """
+        waiting_tasks = self.__simulator.waiting_tasks.get(resource_type)
+        return 0 if waiting_tasks is None else len(waiting_tasks)
+
+    def snapshot(self):
+        """
+        Returns a read-only copy of the state of the simulation that planners would otherwise have to reconstruct from the reported events:
+        the tasks that wait for a resource per resource type, the busy resources with the tasks they work on and their start times,
+        the patients after intake, the events that are planned per case and the resource counts, see StateSnapshot.
+        Building the snapshot takes time linear in the number of waiting tasks, busy resources and planned events, so take one snapshot per planning moment.
+        """
+        simulator = self.__simulator
+        pending_events = dict()
+        for (case_id, label), (moment, _, _, _) in simulator.events.index.items():
+            if case_id not in pending_events:
+                pending_events[case_id] = []
+            pending_events[case_id].append((label, moment))
+        return StateSnapshot(
+            simulator.now,
+            MappingProxyType({resource_type: tuple(tasks) for resource_type, tasks in simulator.waiting_tasks.items() if len(tasks) > 0}),
+            MappingProxyType(dict(simulator.busy_resources)),
+            tuple(getattr(self.__problem, "patients_after_intake", ())),
+            MappingProxyType({case_id: tuple(sorted(events, key=lambda event: event[1])) for case_id, events in pending_events.items()}),
+            MappingProxyType({resource_type: MappingProxyType(counts) for resource_type, counts in self.resource_counts().items()})
+        )
+
     def get_case_type(self, case_id):
         """
         Returns the type of the case with the given id.
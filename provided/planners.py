@@ -35,4 +35,31 @@ class Planner(ABC):
         The method that can be implemented for reporting.
         It is called by the simulator upon each simulation event.
         '''
-        pass
\ No newline at end of file
+        pass
+
+
+class IncrementalPlanner(Planner):
+    """
+    A planner that is only told what changed in the elements that can be planned since it was last asked to plan,
+    so that the cost of planning grows with the number of changes rather than with the number of elements that wait to be planned.
+    The simulator calls plan_changes instead of plan, in every planning pass in which elements can be planned or there are changes,
+    so the removal of the last plannable element is passed on right away. The full dictionary of plannable elements is available through planner_helper.plannable_elements.
+    """
+
+    @abstractmethod
+    def plan_changes(self, added, removed, simulation_time):
+        '''
+        The method that must be implemented for incremental planning.
+        :param added: A list of (case_id, element_label) tuples that became plannable since the previous call, or since the planner was attached to the simulator.
+        :param removed: A list of (case_id, element_label) tuples that are no longer plannable since the previous call,
+            because they were planned, also by this planner in the previous call, or because the case no longer needs them.
+        :param simulation_time: The current simulation time.
+        :return: A list of tuples of how the elements are planned. Each tuple must have the following format: (case_id, element_label, timestamp).
+        '''
+        pass
+
+    def plan(self, plannable_elements, simulation_time):
+        '''
+        Plans all plannable elements at once, by passing all of them as added elements to plan_changes.
+        '''
+        return self.plan_changes([(case_id, element_label) for case_id, element_labels in plannable_elements.items() for element_label in element_labels], [], simulation_time)
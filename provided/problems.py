@@ -1,8 +1,146 @@
 from enum import Enum, auto, StrEnum
-import random
 import pickle
+import copy
+import math
+import json
+import zlib
+import hashlib
+from bisect import bisect_left, bisect_right
+from functools import partial
+from itertools import accumulate
 from abc import ABC, abstractmethod
-import collections
+import numpy as np
+from arrivaltrace import ArrivalTrace
+
+
+class BlockSampler:
+    """
+    Serves random variates of a family of distributions, one per key, from buffers that are refilled a block at a time when they run empty.
+    Each key has its own NumPy random number generator, seeded from the seed, the name of the sampler and the key,
+    so the variates for one key do not depend on how many variates were drawn for other keys.
+    A block is drawn with one vectorized call of the generator, and served as a list of Python values.
+    """
+    def __init__(self, seed, name, draw, block_size=256):
+        """
+        :param seed: the seed of the sampler. If None, the generators are seeded from the operating system.
+        :param name: the name of the sampler, which distinguishes its generators from those of other samplers with the same seed.
+        :param draw: a picklable function (numpy.random.Generator, key, count) -> list of count variates for the key.
+        :param block_size: the number of variates that is drawn at a time.
+        """
+        self.seed = seed
+        self.name = name
+        self.draw = draw
+        self.block_size = block_size
+        self.generators = dict()  # dictionary of key -> random number generator of the key
+        self.buffers = dict()  # dictionary of key -> list of variates that have not been served yet, the next one last
+
+    def sample(self, key):
+        """
+        Returns the next variate for the key.
+        """
+        buffer = self.buffers.get(key)
+        if not buffer:
+            if key not in self.generators:
+                self.generators[key] = self.create_generator(key)
+            buffer = self.draw(self.generators[key], key, self.block_size)
+            buffer.reverse()
+            self.buffers[key] = buffer
+        return buffer.pop()
+
+    def copy(self):
+        """
+        Returns a copy of the sampler that serves the same variates as this sampler from now on.
+        """
+        sampler = copy.copy(self)
+        sampler.generators = {key: copy.deepcopy(generator) for key, generator in self.generators.items()}
+        sampler.buffers = {key: list(buffer) for key, buffer in self.buffers.items()}
+        return sampler
+
+    def create_generator(self, key):
+        """
+        Returns a new generator for the key, seeded from a hash of the seed, the name of the sampler and the key.
+        """
+        if self.seed is None:
+            return np.random.Generator(np.random.PCG64())
+        digest = hashlib.sha256((str(self.seed) + "/" + self.name + "/" + self.key_name(key)).encode()).digest()
+        return np.random.Generator(np.random.PCG64(int.from_bytes(digest[:16], "little")))
+
+    @staticmethod
+    def key_name(key):
+        return "/".join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+
+    def write_checkpoint(self, checkpoint, name):
+        """
+        Adds the state of the generators and the buffers to a checkpoint under the given section name.
+        """
+        keys = list(self.generators)
+        buffers = [self.buffers.get(key, []) for key in keys]
+        values = [value for buffer in buffers for value in buffer]
+        checkpoint.document(name + "/keys", [self.key_name(key) for key in keys])
+        checkpoint.document(name + "/states", [self.generators[key].bit_generator.state for key in keys])
+        checkpoint.column(name + "/buffer_lengths", "q", [len(buffer) for buffer in buffers])
+        if all(isinstance(value, float) for value in values):
+            checkpoint.column(name + "/buffer_values", "d", values)
+        else:
+            checkpoint.document(name + "/buffer_values", values)
+
+    def read_checkpoint(self, checkpoint, name, keys):
+        """
+        Restores the state of the generators and the buffers from a checkpoint.
+        :param keys: the keys that the sampler can have, to restore the keys from their names.
+        """
+        keys_by_name = {self.key_name(key): key for key in keys}
+        keys = [keys_by_name[key_name] for key_name in checkpoint.document(name + "/keys")]
+        if checkpoint.is_column(name + "/buffer_values"):
+            values = checkpoint.column(name + "/buffer_values")
+        else:
+            values = checkpoint.document(name + "/buffer_values")
+        self.generators = dict()
+        self.buffers = dict()
+        position = 0
+        for key, state, length in zip(keys, checkpoint.document(name + "/states"), checkpoint.column(name + "/buffer_lengths")):
+            generator = np.random.Generator(np.random.PCG64())
+            generator.bit_generator.state = state
+            self.generators[key] = generator
+            self.buffers[key] = list(values[position:position + length])
+            position += length
+
+
+class CyclicCalendar:
+    """
+    Moments and periods that recur with a fixed cycle, e.g. every week.
+    A question about a time is answered by bisecting the sorted moments or periods within one cycle,
+    instead of by modulo arithmetic and comparisons with each of them.
+    """
+    def __init__(self, cycle, moments=(), periods=()):
+        """
+        :param cycle: the length of the cycle in hours.
+        :param moments: the recurring moments, in hours from the start of the cycle.
+        :param periods: the recurring periods as (start, end) tuples in hours from the start of the cycle, which include their start and end and do not overlap.
+        """
+        self.cycle = cycle
+        self.moments = sorted(moments)
+        periods = sorted(periods)
+        self.period_starts = [start for (start, _) in periods]
+        self.period_ends = [end for (_, end) in periods]
+
+    def next_moment(self, time, after=False):
+        """
+        Returns the first moment at or, if after is True, after the given time.
+        """
+        time_in_cycle = time % self.cycle
+        i = bisect_right(self.moments, time_in_cycle) if after else bisect_left(self.moments, time_in_cycle)
+        if i < len(self.moments):
+            return (time - time_in_cycle) + self.moments[i]
+        return (time - time_in_cycle) + self.cycle + self.moments[0]
+
+    def in_period(self, time):
+        """
+        Returns whether the given time is in one of the periods.
+        """
+        time_in_cycle = time % self.cycle
+        i = bisect_right(self.period_starts, time_in_cycle) - 1
+        return i >= 0 and time_in_cycle <= self.period_ends[i]
 
 
 class ElementType(Enum):
@@ -21,15 +159,18 @@ class Element:
     - label: the label of the element.
     - element_type: the type of the element, which is either a task or an event.
     - data: a dictionary of data that is associated with the element; the dictionary keys are the data types and the values are the data values.
+      Elements of the same case share the dictionary of the case data, see Problem.add_data.
     - occurrence_time: the time when the event should occur in absolute simulation time; used for events only and must be set for each event.
     """
-    def __init__(self, case_id, case_type, element_id, label, element_type, occurrence_time=None):
+    __slots__ = ("id", "case_id", "label", "case_type", "element_type", "data", "occurrence_time")
+
+    def __init__(self, case_id, case_type, element_id, label, element_type, occurrence_time=None, data=None):
         self.id = element_id
         self.case_id = case_id
         self.label = label
         self.case_type = case_type
         self.element_type = element_type
-        self.data = dict()
+        self.data = data if data is not None else dict()
         self.occurrence_time = occurrence_time  # used for time-based events only, represents the time when the event should occur
         if self.is_event() and self.occurrence_time is None:
             raise ValueError("The occurrence time of an event must be set.")
@@ -55,10 +196,19 @@ class ResourceType(StrEnum):
 
 class Resource:
     """
+    A resource has a:
+    - type: the ResourceType of the resource.
+    - id: the id of the resource, which is unique over all resources of the problem.
     """
+    __slots__ = ("type", "id", "_hash")
+
     def __init__(self, type, id):
         self.type = type
         self.id = id
+        self._hash = zlib.crc32(str(id).encode())  # unlike the default hash, this does not change between runs, so the order of sets of resources is reproducible
+
+    def __hash__(self):
+        return self._hash
 
     def __str__(self):
         return str(self.id)
@@ -71,6 +221,7 @@ class Problem(ABC):
         self.case_types = []  # a list of case types that can be generated in the problem.
         
         self.can_plan = dict()  # a dictionary of case_id to list of element labels that can be planned for that case.
+        self.can_plan_changes = None  # a dictionary of (case_id, element label) -> net number of times it was added to can_plan since the changes were last taken, or None if changes are not tracked
         self.next_case_id = 0  # the id of the next case to be generated.
         self.next_case_arrival_time = dict()  # a dictionary of case type to the time of the next case arrival of that type.
         self.next_element_id = 0  # the id of the next element to be generated.
@@ -90,6 +241,75 @@ class Problem(ABC):
         with open(filename, 'wb') as handle:
             pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
 
+    @classmethod
+    def from_checkpoint(cls, checkpoint):
+        """
+        Returns a problem in the state that was added to a checkpoint with write_checkpoint, see Simulator.from_checkpoint.
+        """
+        problem = cls()
+        problem.read_checkpoint(checkpoint)
+        return problem
+
+    def write_checkpoint(self, checkpoint):
+        """
+        Adds the state of the problem to a checkpoint, see Simulator.save_checkpoint.
+        Problems with more state extend this method and read_checkpoint.
+        The values of the case data must be JSON values or enum members.
+        """
+        checkpoint.document("problem/counters", {
+            "next_case_id": self.next_case_id,
+            "next_element_id": self.next_element_id,
+            "next_case_arrival_time": [[case_type, moment] for case_type, moment in self.next_case_arrival_time.items()]
+        })
+        checkpoint.column("problem/can_plan/case_id", "q", self.can_plan.keys())
+        checkpoint.column("problem/can_plan/count", "q", [len(element_labels) for element_labels in self.can_plan.values()])
+        checkpoint.coded("problem/can_plan/label", [label for element_labels in self.can_plan.values() for label in element_labels])
+        checkpoint.column("problem/case_type/case_id", "q", self.case_type.keys())
+        checkpoint.coded("problem/case_type/case_type", self.case_type.values())
+        data_types = list(dict.fromkeys(data_type for data in self.case_data.values() for data_type in data))
+        checkpoint.document("problem/case_data/data_types", data_types)
+        checkpoint.column("problem/case_data/case_id", "q", self.case_data.keys())
+        for i, data_type in enumerate(data_types):
+            checkpoint.column("problem/case_data/" + str(i) + "/present", "b", [data_type in data for data in self.case_data.values()])
+            checkpoint.coded("problem/case_data/" + str(i) + "/value", [data.get(data_type) for data in self.case_data.values()])
+
+    def read_checkpoint(self, checkpoint):
+        """
+        Restores the state of the problem from a checkpoint, see write_checkpoint.
+        """
+        counters = checkpoint.document("problem/counters")
+        self.next_case_id = counters["next_case_id"]
+        self.next_element_id = counters["next_element_id"]
+        self.next_case_arrival_time = {case_type: moment for (case_type, moment) in counters["next_case_arrival_time"]}
+        labels = iter(checkpoint.coded("problem/can_plan/label"))
+        self.can_plan = dict()
+        for case_id, count in zip(checkpoint.column("problem/can_plan/case_id"), checkpoint.column("problem/can_plan/count")):
+            self.can_plan[case_id] = [next(labels) for _ in range(count)]
+        self.case_type = dict(zip(checkpoint.column("problem/case_type/case_id"), checkpoint.coded("problem/case_type/case_type")))
+        self.case_data = {case_id: dict() for case_id in checkpoint.column("problem/case_data/case_id")}
+        for i, data_type in enumerate(checkpoint.document("problem/case_data/data_types")):
+            present = checkpoint.column("problem/case_data/" + str(i) + "/present")
+            values = checkpoint.coded("problem/case_data/" + str(i) + "/value")
+            for data, is_present, value in zip(self.case_data.values(), present, values):
+                if is_present:
+                    data[data_type] = value
+
+    def fork(self, simulator, seed=None):
+        """
+        Returns a copy of the problem for a forked simulator, see Simulator.fork.
+        Only mutable state is copied, the resources, case types and the data of each case are shared.
+        The data of a case must therefore not change after the case has arrived, see add_data.
+        :param simulator: the forked simulator.
+        :param seed: the seed for the random number streams of the fork, if the problem has any.
+        """
+        fork = copy.copy(self)
+        fork.simulator = simulator
+        fork.can_plan = {case_id: list(element_labels) for case_id, element_labels in self.can_plan.items()}
+        fork.next_case_arrival_time = dict(self.next_case_arrival_time)
+        fork.case_type = dict(self.case_type)
+        fork.case_data = dict(self.case_data)
+        return fork
+
     @abstractmethod
     def resource_pool(self, task):
         """
@@ -102,6 +322,8 @@ class Problem(ABC):
         Resets the problem to its initial state.
         """
         self.can_plan = dict()
+        if self.can_plan_changes is not None:
+            self.can_plan_changes = dict()
         self.next_case_id = 0
         self.next_case_arrival_time = dict()
         for ct in self.case_types:
@@ -113,7 +335,8 @@ class Problem(ABC):
     @abstractmethod
     def next_case(self):
         """
-        Returns the next case to be generated, which is a tuple of arrival time and the initial Element of the case.
+        Returns the next case to be generated, which is a tuple of arrival time and the initial Element of the case,
+        or (None, None) if no more cases arrive.
         """
         raise NotImplementedError
 
@@ -138,6 +361,13 @@ class Problem(ABC):
         """
         raise NotImplementedError
 
+    def next_availability_change(self, resource, simulation_time):
+        """
+        Returns the next moment after the given time at which the availability of the resource may change, or None if it never changes.
+        The simulator only checks the availability of the resource at those moments. By default that is every whole hour.
+        """
+        return math.floor(simulation_time) + 1
+
     @abstractmethod
     def complete_element(self, element):
         """
@@ -165,11 +395,40 @@ class Problem(ABC):
 
         return unique_id
     
-    def assign_resources(self, unassigned_tasks, available_resources):
+    def resource_type(self, task):
         """
-        Assigns tasks to resources
+        Returns the type of the resources that can be used to complete the given task.
+        By default that is the type of the first resource in the resource pool of the task.
         """
-        raise NotImplementedError
+        return self.resource_pool(task)[0].type
+
+    def task_priority(self, task):
+        """
+        Returns the priority with which the given task is assigned a resource, where a lower number goes first.
+        Tasks with the same priority are assigned in the order in which they were activated. By default all tasks have the same priority.
+        """
+        return 0
+
+    def assign_resources(self, waiting_tasks, free_resources):
+        """
+        Assigns tasks to resources.
+        By default, the free resources of each type are assigned to the tasks that wait for that type, in the order of the queue,
+        last in first out: the resource that became available last is assigned first. Pools are dictionaries rather than sets,
+        because the order of a set is not kept when it is copied, and forks must assign the same resources as their parent.
+        :param waiting_tasks: a dictionary of resource type -> queue of the tasks that wait for a resource of that type, ordered by task_priority and then by activation.
+        :param free_resources: a dictionary of resource type -> dictionary of available resources of that type -> None, in the order in which they became available.
+            Assigned resources must be removed from it.
+        :return: a list of (task, resource) tuples.
+        """
+        assignments = []
+        for resource_type, pool in free_resources.items():
+            if len(pool) == 0 or len(waiting_tasks.get(resource_type, ())) == 0:
+                continue
+            for task in waiting_tasks[resource_type]:
+                assignments.append((task, pool.popitem()[0]))  # the resource that became available last
+                if len(pool) == 0:
+                    break
+        return assignments
 
     def plan(self, case_id, element_label, time):
         if case_id not in self.simulator.case_start_times:
@@ -184,14 +443,49 @@ class Problem(ABC):
         if case_id not in self.can_plan:
             self.can_plan[case_id] = []
         self.can_plan[case_id].append(element_label)
+        if self.can_plan_changes is not None:
+            self.__change_can_plan((case_id, element_label), 1)
     
     def remove_can_plan(self, case_id, element_label):
         self.can_plan[case_id].remove(element_label)
         if len(self.can_plan[case_id]) == 0:
             del self.can_plan[case_id]
+        if self.can_plan_changes is not None:
+            self.__change_can_plan((case_id, element_label), -1)
+
+    def __change_can_plan(self, key, change):
+        count = self.can_plan_changes.get(key, 0) + change
+        if count == 0:
+            del self.can_plan_changes[key]
+        else:
+            self.can_plan_changes[key] = count
+
+    def track_can_plan_changes(self, enabled):
+        """
+        Starts or stops tracking the changes to can_plan, see take_can_plan_changes.
+        Tracking starts from an empty can_plan, so the first changes that are taken include everything that can be planned at the start.
+        """
+        if not enabled:
+            self.can_plan_changes = None
+            return
+        self.can_plan_changes = dict()
+        for case_id, element_labels in self.can_plan.items():
+            for element_label in element_labels:
+                self.__change_can_plan((case_id, element_label), 1)
+
+    def take_can_plan_changes(self):
+        """
+        Returns the changes to can_plan since the changes were last taken and starts collecting new changes.
+        An element that was added and then removed again, or the other way around, is not a change.
+        :return: a tuple of a list of (case_id, element label) that were added and a list of (case_id, element label) that were removed, in the order in which they changed.
+        """
+        added = [key for key, count in self.can_plan_changes.items() if count > 0]
+        removed = [key for key, count in self.can_plan_changes.items() if count < 0]
+        self.can_plan_changes = dict()
+        return (added, removed)
 
     def end_case(self, case_id):
-        self.simulator.busy_cases[case_id] = []
+        self.simulator.busy_cases[case_id].clear()
 
 
     @abstractmethod
@@ -203,14 +497,15 @@ class Problem(ABC):
 
     def add_data(self, element, data):
         """
-        Adds the given data to the given element and updates the case data as well.
+        Adds the given data to the case data and lets the given element share the case data.
         This method should be used to add data to the element. Data should not be added directly to the element, otherwise the case data will not be updated.
+        Data must only be added when a case arrives. The case data is shared with forks of the problem, so adding data to a case later changes it in its forks too.
         """
-        element.data = data
         if element.case_id not in self.case_data:
             self.case_data[element.case_id] = data
         else:
             self.case_data[element.case_id].update(data)
+        element.data = self.case_data[element.case_id]
 
     def get_case_type(self, case_id):
         """
@@ -264,42 +559,316 @@ class HealthcareElements(StrEnum):
 
 
 class HealthcareProblem(Problem):
-    
-    def __init__(self):
+    # the hospital: the diagnoses of new cases per case type, the processing times of the tasks that do not depend on the diagnosis
+    # and, per diagnosis, the first treatment, the type of bed for nursing, the complication probability after nursing and the processing times
+    # processing times are normally distributed with [mean, standard deviation]; for nursing, the patient is released at the first release time after the processing time
+    # the number of resources of each type and, per case type, a factor on the arrival rate, where 1 is the base rate
+    # a configuration in the same format can be loaded from a JSON file with load_configuration and scaled with scale_configuration
+    CONFIGURATION = {
+        "resources": {"OR": 5, "A_BED": 30, "B_BED": 40, "INTAKE": 4, "ER_PRACTITIONER": 9},
+        "arrival_rates": {"A": 1, "B": 1, "EM": 1},
+        "case_diagnoses": {
+            "A": {"diagnosis_probability": 1, "diagnoses": {"A1": 50, "A2": 25, "A3": 12.5, "A4": 12.5}},
+            "B": {"diagnosis_probability": 1, "diagnoses": {"B1": 50, "B2": 25, "B3": 12.5, "B4": 12.5}},
+            "EM": {"diagnosis_probability": 0.5, "diagnoses": {"B1": 50, "B2": 25, "B3": 12.5, "B4": 12.5}}
+        },
+        "processing_times": {"intake": [1, 1/8], "ER_treatment": [2, 1/2]},
+        "diagnoses": {
+            "A1": {"treatment": "nursing", "bed": "A_BED", "complication_probability": 0.01, "processing_times": {"nursing": [4, 1/2]}},
+            "A2": {"treatment": "surgery", "bed": "A_BED", "complication_probability": 0.01, "processing_times": {"surgery": [1, 1/4], "nursing": [8, 2]}},
+            "A3": {"treatment": "surgery", "bed": "A_BED", "complication_probability": 0.02, "processing_times": {"surgery": [2, 1/2], "nursing": [16, 2]}},
+            "A4": {"treatment": "surgery", "bed": "A_BED", "complication_probability": 0.02, "processing_times": {"surgery": [4, 1/2], "nursing": [16, 2]}},
+            "B1": {"treatment": "nursing", "bed": "B_BED", "complication_probability": 0.001, "processing_times": {"nursing": [8, 2]}},
+            "B2": {"treatment": "nursing", "bed": "B_BED", "complication_probability": 0.01, "processing_times": {"nursing": [16, 2]}},
+            "B3": {"treatment": "surgery", "bed": "B_BED", "complication_probability": 0.02, "processing_times": {"surgery": [4, 1/2], "nursing": [16, 4]}},
+            "B4": {"treatment": "surgery", "bed": "B_BED", "complication_probability": 0.02, "processing_times": {"surgery": [4, 1], "nursing": [16, 4]}}
+        }
+    }
+    # resource name in a process configuration file like own/config.json -> resource type
+    PROCESS_RESOURCE_TYPES = {
+        "intake": ResourceType.INTAKE,
+        "surgery": ResourceType.OR,
+        "nursing_a": ResourceType.A_BED,
+        "nursing_b": ResourceType.B_BED,
+        "em": ResourceType.ER_PRACTITIONER
+    }
+    # task label -> type of the resources that perform the task, nursing is done in the bed of the diagnosis
+    TASK_RESOURCE_TYPES = {
+        HealthcareElements.INTAKE: ResourceType.INTAKE,
+        HealthcareElements.ER_TREATMENT: ResourceType.ER_PRACTITIONER,
+        HealthcareElements.SURGERY: ResourceType.OR
+    }
+    # planned event label -> type of the resources that the event claims in its planning slot
+    PLANNED_RESOURCE_TYPES = {HealthcareElements.TIME_FOR_INTAKE: ResourceType.INTAKE}
+    # task labels of which the processing time depends on the diagnosis
+    DIAGNOSIS_TASKS = frozenset([HealthcareElements.SURGERY, HealthcareElements.NURSING])
+    # patients are released in batches at 8:00, 13:00 and 18:00 of every third day
+    RELEASE_TIMES = CyclicCalendar(72, moments=[8, 13, 18])
+
+    def __init__(self, seed=None, configuration=None, arrival_trace=None):
+        """
+        :param seed: the seed of the random number streams of the problem. If None, the streams are seeded from the operating system.
+            Each stochastic component has its own stream, so with the same seed two planners are evaluated on the same arrivals, case types and diagnoses,
+            regardless of the random numbers that the planners draw themselves. The processing times and complications are drawn per task label and diagnosis
+            in the order in which tasks start, which depends on the planner, so they are not synchronized between planners.
+        :param configuration: the diagnoses, processing times and complication probabilities in the format of HealthcareProblem.CONFIGURATION,
+            e.g. as returned by load_configuration. If None, HealthcareProblem.CONFIGURATION is used.
+        :param arrival_trace: an ArrivalTrace of which the cases are replayed, instead of sampling the arrival times, case types and diagnoses of new cases.
+            When all cases of the trace have arrived, no more cases arrive. If None, cases are sampled.
+        """
         super().__init__()
+        self.seed = seed
         self.case_types = ["A", "B", "EM"]
-        self.__create_resources()
+        self.configuration = self.CONFIGURATION if configuration is None else configuration
+        self.__create_resources(self.configuration.get("resources", self.CONFIGURATION["resources"]))
+        self.__compile_configuration(self.configuration)
+        self.arrival_trace = arrival_trace
+        if arrival_trace is not None:
+            for case_type in arrival_trace.case_types:
+                if case_type not in self.case_types:
+                    raise ValueError("Unknown case type in arrival trace", case_type)
+            for diagnosis in arrival_trace.diagnoses:
+                if diagnosis not in self.treatments:
+                    raise ValueError("Unknown diagnosis in arrival trace", diagnosis)
         self.planning_slot_usage = dict()  # (time, resource_type) -> list of planned element ids; time is in hours from Monday 2018-01-01 00:00 multiplied by 10 to avoid floating point errors
-        self.planned_in_slot = dict()  # (case_id, element_label) -> (time, resource_type)
+        self.planned_in_slot = dict()  # (case_id, element_label) -> (time, resource_type) of the planned events that have not yet happened or been cancelled
         self.patients_after_intake = [] # list of patients  having completed intake but no surgery / nursing has yet started
-        self.er_treatment_finished = dict()
-        self.er_surgery_nursing_started = dict()
         self.restart()
 
-    def __create_resources(self):
-        self.__ORs = [Resource(ResourceType.OR, "OR" + str(i)) for i in range(1, 6)]
-        self.__A_BEDs = [Resource(ResourceType.A_BED, "A_BED" + str(i)) for i in range(1, 31)]
-        self.__B_BEDs = [Resource(ResourceType.B_BED, "B_BED" + str(i)) for i in range(1, 41)]
-        self.__INTAKEs = [Resource(ResourceType.INTAKE, "INTAKE" + str(i)) for i in range(1, 5)]
-        self.__ER_PRACTITIONERs = [Resource(ResourceType.ER_PRACTITIONER, "ER_PRACTITIONER" + str(i)) for i in range(1,10)]
-        self.resources = self.__ORs + self.__A_BEDs + self.__B_BEDs + self.__INTAKEs + self.__ER_PRACTITIONERs
+    def __create_resources(self, resource_counts):
+        """
+        Creates the given number of resources of each type, e.g. OR1 to OR5 for 5 ORs.
+        Types that are not in resource_counts get the number of HealthcareProblem.CONFIGURATION.
+        """
+        resource_counts = HealthcareProblem.merge_resource_counts(resource_counts)
+        self.__resource_pools = dict()
+        for resource_type in ResourceType:
+            self.__resource_pools[resource_type] = [Resource(resource_type, resource_type.value + str(i)) for i in range(1, resource_counts[resource_type.value] + 1)]
+        self.resources = [resource for pool in self.__resource_pools.values() for resource in pool]
+
+    @staticmethod
+    def merge_resource_counts(resource_counts):
+        """
+        Returns a new dictionary with the number of resources of each type, from resource_counts where present and from HealthcareProblem.CONFIGURATION otherwise,
+        so that a configuration only needs to list the types of which it changes the number.
+        """
+        merged = dict(HealthcareProblem.CONFIGURATION["resources"])
+        merged.update(resource_counts)
+        return merged
+
+    @staticmethod
+    def load_configuration(file_name):
+        """
+        Loads a configuration in the format of HealthcareProblem.CONFIGURATION from a JSON file.
+        """
+        with open(file_name) as file:
+            return json.load(file)
+
+    @staticmethod
+    def load_resources(file_name, configuration=None):
+        """
+        Returns a copy of the configuration with the number of resources of each type from a process configuration file like own/config.json,
+        in which each resource has a name and a max. Resources of which the name is not in PROCESS_RESOURCE_TYPES are ignored.
+        :param configuration: the configuration to copy. If None, HealthcareProblem.CONFIGURATION is used.
+        """
+        configuration = copy.deepcopy(HealthcareProblem.CONFIGURATION if configuration is None else configuration)
+        with open(file_name) as file:
+            process_configuration = json.load(file)
+        resource_counts = HealthcareProblem.merge_resource_counts(configuration.get("resources", dict()))
+        for resource in process_configuration["resources"]:
+            if resource["name"] in HealthcareProblem.PROCESS_RESOURCE_TYPES:
+                resource_counts[HealthcareProblem.PROCESS_RESOURCE_TYPES[resource["name"]].value] = resource["max"]
+        configuration["resources"] = resource_counts
+        return configuration
+
+    @staticmethod
+    def scale_configuration(configuration=None, resources=1, arrivals=1):
+        """
+        Returns a copy of the configuration in which the number of resources of each type and the arrival rate of each case type are multiplied by a factor,
+        e.g. to simulate a hospital that is 10 times as large with resources=10 and arrivals=10. Each type keeps at least one resource.
+        :param configuration: the configuration to scale. If None, HealthcareProblem.CONFIGURATION is used.
+        """
+        configuration = copy.deepcopy(HealthcareProblem.CONFIGURATION if configuration is None else configuration)
+        configuration["resources"] = {resource_type: max(1, round(count * resources))
+                                      for resource_type, count in HealthcareProblem.merge_resource_counts(configuration.get("resources", dict())).items()}
+        configuration["arrival_rates"] = {case_type: rate * arrivals
+                                          for case_type, rate in configuration.get("arrival_rates", HealthcareProblem.CONFIGURATION["arrival_rates"]).items()}
+        return configuration
+
+    def __compile_configuration(self, configuration):
+        """
+        Compiles the configuration into lookup tables, so that routing and sampling take a single lookup per element.
+        """
+        self.arrival_rates = dict(configuration.get("arrival_rates", self.CONFIGURATION["arrival_rates"]))  # case type -> factor on the arrival rate
+        self.diagnosis_distributions = dict()  # case type -> (probability that a case has a diagnosis, diagnoses, cumulative weights of the diagnoses)
+        for case_type, distribution in configuration["case_diagnoses"].items():
+            diagnoses = list(distribution["diagnoses"])
+            cum_weights = list(accumulate(distribution["diagnoses"].values()))
+            self.diagnosis_distributions[case_type] = (distribution["diagnosis_probability"], diagnoses, cum_weights)
+        self.processing_times = dict()  # (task label, diagnosis or None) -> (mean, standard deviation) of the processing time
+        for label, (mean, standard_deviation) in configuration["processing_times"].items():
+            self.processing_times[(HealthcareElements(label), None)] = (mean, standard_deviation)
+        self.treatments = dict()  # diagnosis -> label of the task after intake, ER treatment or a complication
+        self.beds = dict()  # diagnosis -> resource type of the bed for nursing
+        self.complication_probabilities = dict()  # diagnosis -> probability of a complication after nursing
+        for diagnosis, properties in configuration["diagnoses"].items():
+            self.treatments[diagnosis] = HealthcareElements(properties["treatment"])
+            self.beds[diagnosis] = ResourceType(properties["bed"])
+            self.complication_probabilities[diagnosis] = properties["complication_probability"]
+            for label, (mean, standard_deviation) in properties["processing_times"].items():
+                self.processing_times[(HealthcareElements(label), diagnosis)] = (mean, standard_deviation)
+
+    def __create_random_streams(self):
+        """
+        Creates one block sampler per stochastic component, each seeded from the seed of the problem and the name of the component.
+        Within a component, each case type, (task label, diagnosis) or diagnosis has its own random number generator.
+        """
+        self.interarrival_sampler = BlockSampler(self.seed, "interarrival", HealthcareProblem.draw_interarrival_times)
+        self.diagnosis_sampler = BlockSampler(self.seed, "diagnosis", partial(HealthcareProblem.draw_diagnoses, self.diagnosis_distributions))
+        self.processing_time_sampler = BlockSampler(self.seed, "processing_time", partial(HealthcareProblem.draw_processing_times, self.processing_times))
+        self.complication_sampler = BlockSampler(self.seed, "complication", HealthcareProblem.draw_uniforms)
+
+    @staticmethod
+    def draw_interarrival_times(generator, case_type, count):
+        """
+        Draws count interarrival times for EM cases, or count offsets into the working day for A and B cases.
+        """
+        if case_type == "EM":
+            return generator.exponential(1, count).tolist()
+        return generator.random(count).tolist()
+
+    @staticmethod
+    def draw_diagnoses(diagnosis_distributions, generator, case_type, count):
+        """
+        Draws count diagnoses for new cases of the case type, where None means that the case has no diagnosis.
+        """
+        (diagnosis_probability, diagnoses, cum_weights) = diagnosis_distributions[case_type]
+        indices = np.searchsorted(cum_weights, generator.random(count) * cum_weights[-1], side="right").tolist()
+        if diagnosis_probability < 1:
+            has_diagnosis = (generator.random(count) < diagnosis_probability).tolist()
+            return [diagnoses[i] if present else None for i, present in zip(indices, has_diagnosis)]
+        return [diagnoses[i] for i in indices]
+
+    @staticmethod
+    def draw_processing_times(processing_times, generator, key, count):
+        """
+        Draws count normally distributed processing times for the (task label, diagnosis).
+        """
+        if key not in processing_times:
+            raise ValueError("Unknown task label or diagnosis", key)
+        (mean, standard_deviation) = processing_times[key]
+        return generator.normal(mean, standard_deviation, count).tolist()
+
+    @staticmethod
+    def draw_uniforms(generator, key, count):
+        return generator.random(count).tolist()
 
     def restart(self):
+        self.__create_random_streams()
         super().restart()
+        self.arrival_position = 0  # index in the arrival trace of the next case to arrive
+        self.planning_slot_usage = dict()
+        self.planned_in_slot = dict()
+        self.planned_element_ids = dict()  # (case_id, element_label) -> id of the planned element, for the planned events in planned_in_slot
+        # running accumulators for evaluate, updated when elements complete and tasks start
+        self.er_waiting_since = dict()  # EM case_id -> moment the ER treatment finished, for EM cases of which no surgery / nursing has started yet
+        self.er_excessive_wait = 0  # sum of the excessive waiting times after ER treatment of the EM cases of which surgery / nursing has started
+        self.time_for_intake_count = dict()  # case_id -> number of completed TIME_FOR_INTAKE events, for cases that have not yet had intake or left
+        self.sent_home_count = 0  # number of completed TIME_FOR_INTAKE events of cases that had more than one
+        self.released_count = 0  # number of completed RELEASING events
+
+    def fork(self, simulator, seed=None):
+        fork = super().fork(simulator, seed)
+        fork.planning_slot_usage = {slot: list(element_ids) for slot, element_ids in self.planning_slot_usage.items()}
+        fork.planned_in_slot = dict(self.planned_in_slot)
+        fork.planned_element_ids = dict(self.planned_element_ids)
+        fork.patients_after_intake = list(self.patients_after_intake)
+        fork.er_waiting_since = dict(self.er_waiting_since)
+        fork.time_for_intake_count = dict(self.time_for_intake_count)
+        if seed is None:
+            fork.interarrival_sampler = self.interarrival_sampler.copy()
+            fork.diagnosis_sampler = self.diagnosis_sampler.copy()
+            fork.processing_time_sampler = self.processing_time_sampler.copy()
+            fork.complication_sampler = self.complication_sampler.copy()
+        else:
+            fork.seed = seed
+            fork.__create_random_streams()
+        return fork
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint):
+        settings = checkpoint.document("healthcare/settings")
+        arrival_trace = None if settings["arrival_trace"] is None else ArrivalTrace(settings["arrival_trace"])
+        problem = cls(seed=settings["seed"], configuration=settings["configuration"], arrival_trace=arrival_trace)
+        problem.read_checkpoint(checkpoint)
+        return problem
+
+    def write_checkpoint(self, checkpoint):
+        super().write_checkpoint(checkpoint)
+        checkpoint.document("healthcare/settings", {
+            "seed": self.seed,
+            "configuration": self.configuration,
+            "arrival_trace": None if self.arrival_trace is None else self.arrival_trace.filename
+        })
+        checkpoint.document("healthcare/accumulators", {
+            "er_excessive_wait": self.er_excessive_wait,
+            "sent_home_count": self.sent_home_count,
+            "released_count": self.released_count,
+            "arrival_position": self.arrival_position
+        })
+        checkpoint.column("healthcare/planning_slot_usage/time", "q", [time for (time, _) in self.planning_slot_usage])
+        checkpoint.coded("healthcare/planning_slot_usage/resource_type", [resource_type for (_, resource_type) in self.planning_slot_usage])
+        checkpoint.column("healthcare/planning_slot_usage/count", "q", [len(element_ids) for element_ids in self.planning_slot_usage.values()])
+        checkpoint.column("healthcare/planning_slot_usage/element_id", "q", [element_id for element_ids in self.planning_slot_usage.values() for element_id in element_ids])
+        checkpoint.column("healthcare/planned_in_slot/case_id", "q", [case_id for (case_id, _) in self.planned_in_slot])
+        checkpoint.coded("healthcare/planned_in_slot/label", [label for (_, label) in self.planned_in_slot])
+        checkpoint.column("healthcare/planned_in_slot/time", "q", [time for (time, _) in self.planned_in_slot.values()])
+        checkpoint.coded("healthcare/planned_in_slot/resource_type", [resource_type for (_, resource_type) in self.planned_in_slot.values()])
+        checkpoint.column("healthcare/planned_in_slot/element_id", "q", [self.planned_element_ids[key] for key in self.planned_in_slot])
+        checkpoint.column("healthcare/patients_after_intake", "q", self.patients_after_intake)
+        checkpoint.column("healthcare/er_waiting_since/case_id", "q", self.er_waiting_since.keys())
+        checkpoint.numbers("healthcare/er_waiting_since/moment", self.er_waiting_since.values())
+        checkpoint.column("healthcare/time_for_intake_count/case_id", "q", self.time_for_intake_count.keys())
+        checkpoint.column("healthcare/time_for_intake_count/count", "q", self.time_for_intake_count.values())
+        self.interarrival_sampler.write_checkpoint(checkpoint, "healthcare/interarrival_sampler")
+        self.diagnosis_sampler.write_checkpoint(checkpoint, "healthcare/diagnosis_sampler")
+        self.processing_time_sampler.write_checkpoint(checkpoint, "healthcare/processing_time_sampler")
+        self.complication_sampler.write_checkpoint(checkpoint, "healthcare/complication_sampler")
+
+    def read_checkpoint(self, checkpoint):
+        super().read_checkpoint(checkpoint)
+        accumulators = checkpoint.document("healthcare/accumulators")
+        self.er_excessive_wait = accumulators["er_excessive_wait"]
+        self.sent_home_count = accumulators["sent_home_count"]
+        self.released_count = accumulators["released_count"]
+        self.arrival_position = accumulators["arrival_position"]
+        element_ids = iter(checkpoint.column("healthcare/planning_slot_usage/element_id"))
         self.planning_slot_usage = dict()
+        for time, resource_type, count in zip(checkpoint.column("healthcare/planning_slot_usage/time"), checkpoint.coded("healthcare/planning_slot_usage/resource_type"), checkpoint.column("healthcare/planning_slot_usage/count")):
+            self.planning_slot_usage[(time, resource_type)] = [next(element_ids) for _ in range(count)]
         self.planned_in_slot = dict()
+        self.planned_element_ids = dict()
+        for case_id, label, time, resource_type, element_id in zip(checkpoint.column("healthcare/planned_in_slot/case_id"), checkpoint.coded("healthcare/planned_in_slot/label"), checkpoint.column("healthcare/planned_in_slot/time"),
+                                                                   checkpoint.coded("healthcare/planned_in_slot/resource_type"), checkpoint.column("healthcare/planned_in_slot/element_id")):
+            self.planned_in_slot[(case_id, label)] = (time, resource_type)
+            self.planned_element_ids[(case_id, label)] = element_id
+        self.patients_after_intake = list(checkpoint.column("healthcare/patients_after_intake"))
+        self.er_waiting_since = dict(zip(checkpoint.column("healthcare/er_waiting_since/case_id"), checkpoint.numbers("healthcare/er_waiting_since/moment")))
+        self.time_for_intake_count = dict(zip(checkpoint.column("healthcare/time_for_intake_count/case_id"), checkpoint.column("healthcare/time_for_intake_count/count")))
+        self.interarrival_sampler.read_checkpoint(checkpoint, "healthcare/interarrival_sampler", self.case_types)
+        self.diagnosis_sampler.read_checkpoint(checkpoint, "healthcare/diagnosis_sampler", self.diagnosis_distributions)
+        self.processing_time_sampler.read_checkpoint(checkpoint, "healthcare/processing_time_sampler", self.processing_times)
+        self.complication_sampler.read_checkpoint(checkpoint, "healthcare/complication_sampler", self.complication_probabilities)
 
     def resource_pool(self, element):
-        if element.label == HealthcareElements.SURGERY:
-            return self.__ORs
-        elif element.label == HealthcareElements.NURSING and self.get_case_data(element.case_id)['diagnosis'].startswith("A"):
-            return self.__A_BEDs
-        elif element.label == HealthcareElements.NURSING and self.get_case_data(element.case_id)['diagnosis'].startswith("B"):
-            return self.__B_BEDs
-        elif element.label == HealthcareElements.INTAKE:
-            return self.__INTAKEs
-        elif element.label == HealthcareElements.ER_TREATMENT:
-            return self.__ER_PRACTITIONERs
+        return self.__resource_pools[self.resource_type(element)]
+
+    def resource_type(self, element):
+        resource_type = self.TASK_RESOURCE_TYPES.get(element.label)
+        if resource_type is not None:
+            return resource_type
+        elif element.label == HealthcareElements.NURSING:
+            return self.beds[self.get_case_data(element.case_id)['diagnosis']]
         else:
             raise ValueError("Unknown task label", element.label)
     
@@ -349,6 +918,22 @@ class HealthcareProblem(Problem):
         else:
             return True
 
+    def next_availability_change(self, resource, simulator_time):
+        """
+        Returns the next shift change of the resource after the given time, or None if the resource is always available.
+        INTAKE staff and the ORs except OR1 are only available during working time.
+        Resources are checked on whole hours, so they arrive at 8:00 and, since working time includes 17:00, they leave at 18:00.
+        """
+        if not (resource.type == ResourceType.INTAKE or (resource.type == ResourceType.OR and not resource.id == "OR1")):
+            return None
+        day = int(simulator_time // 24)
+        while True:
+            if day % 7 < 5:  # monday-friday
+                for shift_change in [8, 18]:
+                    if day * 24 + shift_change > simulator_time:
+                        return day * 24 + shift_change
+            day += 1
+
     def resources_idle(self, resource_type, simulator_time):
         """
         Returns if any resource of resource_type is idle
@@ -357,32 +942,14 @@ class HealthcareProblem(Problem):
         if not self.resource_type_available(resource_type, simulator_time):
             return False
         
-        for resource in self.simulator.available_resources:
-            if resource.type == resource_type:
-                return True
-        return False
+        return len(self.simulator.free_resources.get(resource_type, ())) > 0
 
 
-    def assign_resources(self, unassigned_tasks, available_resources):
+    def task_priority(self, task):
         """
         assign emergency tasks first, i.e., prioritize them
         """
-        assignments = []
-        resources_to_use = set(available_resources)
-        emergency_tasks = filter(lambda k : k.case_type == 'EM', unassigned_tasks.values())
-        for emergency_task in emergency_tasks:
-            valid_resources = list(resources_to_use & set(self.resource_pool(emergency_task)))
-            if valid_resources:
-                assignments.append((emergency_task, valid_resources[0]))
-                resources_to_use.remove(valid_resources[0])
-        
-        non_emergency_tasks = filter(lambda k : k.case_type != 'EM', unassigned_tasks.values())
-        for non_emergency_task in non_emergency_tasks:
-            valid_resources = list(resources_to_use & set(self.resource_pool(non_emergency_task)))
-            if valid_resources:
-                assignments.append((non_emergency_task, valid_resources[0]))
-                resources_to_use.remove(valid_resources[0])
-        return assignments
+        return 0 if task.case_type == 'EM' else 1
 
     def plan(self, case_id, element_label, time):
         if time < self.simulator.now:
@@ -392,27 +959,63 @@ class HealthcareProblem(Problem):
         if element_label == HealthcareElements.TIME_FOR_INTAKE and time < self.simulator.now + 24:
             raise ValueError("The time for intake must be at least one day (24 hours) after the current time.")
         e = super().plan(case_id, element_label, time)[0]
+        if element_label in self.PLANNED_RESOURCE_TYPES:
+            self.release_planning_slot(case_id, element_label)
+            slot = (round(time * 10), self.PLANNED_RESOURCE_TYPES[element_label])
+            if slot not in self.planning_slot_usage:
+                self.planning_slot_usage[slot] = []
+            self.planning_slot_usage[slot].append(e.id)
+            self.planned_in_slot[(case_id, element_label)] = slot
+            self.planned_element_ids[(case_id, element_label)] = e.id
         return [e]
 
+    def release_planning_slot(self, case_id, element_label):
+        """
+        Removes the planned event of the case with the given label from the slot ledger, when the event happens or is cancelled.
+        """
+        slot = self.planned_in_slot.pop((case_id, element_label), None)
+        if slot is None:
+            return
+        element_ids = self.planning_slot_usage[slot]
+        element_ids.remove(self.planned_element_ids.pop((case_id, element_label)))
+        if len(element_ids) == 0:
+            del self.planning_slot_usage[slot]
+
+    def planned_count(self, time, resource_type):
+        """
+        Returns the number of events that are planned at the given time and claim a resource of the given type, in O(1).
+        """
+        return len(self.planning_slot_usage.get((round(time * 10), resource_type), ()))
+
+    def next_free_planning_slot(self, time, resource_type, capacity=None):
+        """
+        Returns the first planning slot at or after the given time in which fewer than capacity events are planned that claim a resource of the given type,
+        or None if all slots in the week from the given time are full.
+        Only the slots that are full are skipped, so this takes time linear in the number of full slots after the given time.
+        :param capacity: the number of events that can be planned in a slot, by default the number of resources of the type. It must be positive.
+        """
+        if capacity is None:
+            capacity = len(self.__resource_pools[resource_type])
+        if capacity <= 0:
+            raise ValueError("The capacity of a planning slot must be positive, but it is " + str(capacity) + " for " + str(resource_type) + ".")
+        slot = self.simulator.next_planning_slot(time)
+        for _ in range(7 * len(self.simulator.PLANNING_SLOTS.moments)):
+            if self.planned_count(slot, resource_type) < capacity:
+                return slot
+            slot = self.simulator.PLANNING_SLOTS.next_moment(slot, after=True)
+        return None
+
     def data_sample(self, element):
         if element.label == HealthcareElements.PATIENT_REFERAL or element.label == HealthcareElements.EMERGENCY_PATIENT:
-            if element.case_type == "A":
-                return {"diagnosis": random.choices(["A1", "A2", "A3", "A4"], weights=[50, 25, 12.5, 12.5], k=1)[0]}
-            elif element.case_type == "B":
-                return {"diagnosis": random.choices(["B1", "B2", "B3", "B4"], weights=[50, 25, 12.5, 12.5], k=1)[0]}
-            elif element.case_type == "EM":
-                if random.random() > 0.5:
-                    return {"diagnosis": random.choices(["B1", "B2", "B3", "B4"], weights=[50, 25, 12.5, 12.5], k=1)[0]}
-                else:
-                    return {"diagnosis" : None}
+            return {"diagnosis": self.diagnosis_sampler.sample(element.case_type)}
         return dict()
 
     def interarrival_time_sample(self, case_type, is_first_arrival=False):
         if case_type == "EM":
-            return random.expovariate(1)
+            return self.interarrival_sampler.sample(case_type) / self.arrival_rates[case_type]
         elif case_type == "A" or case_type == "B":
             current_time = self.next_case_arrival_time[case_type] if not is_first_arrival else 0
-            ia_time = random.uniform(0, 1)  # A/B patients only arrive between 9-17 on weekdays
+            ia_time = self.interarrival_sampler.sample(case_type) / self.arrival_rates[case_type]  # A/B patients only arrive between 9-17 on weekdays
             time_in_week = current_time % (24 * 7) + ia_time
             if time_in_week % 24 > 17:  # if the case arrives after 17:00, it is postponed to the next day
                 time_in_week += 7
@@ -425,75 +1028,48 @@ class HealthcareProblem(Problem):
             raise ValueError("Unknown case type")
 
     def processing_time_sample(self, resource, task, simulation_time):
-        if task.label == HealthcareElements.INTAKE:
-            return max(0, random.normalvariate(1, 1/8))
-        elif task.label == HealthcareElements.ER_TREATMENT:
-            return max(0, random.normalvariate(2, 1/2))
-        elif task.label == HealthcareElements.SURGERY:
-            diagnosis = self.get_case_data(task.case_id)["diagnosis"]
-            if diagnosis == "A2":
-                return max(0, random.normalvariate(1, 1/4))
-            elif diagnosis == "A3":
-                return max(0, random.normalvariate(2, 1/2))
-            elif diagnosis == "A4":
-                return max(0, random.normalvariate(4, 1/2))
-            elif diagnosis == "B3":
-                return max(0, random.normalvariate(4, 1/2))
-            elif diagnosis == "B4":
-                return max(0, random.normalvariate(4, 1))
-        elif task.label == HealthcareElements.NURSING:
-            diagnosis = self.get_case_data(task.case_id)["diagnosis"]
-            if diagnosis == "A1":
-                duration = random.normalvariate(4, 1/2)
-            elif diagnosis == "A2":
-                duration = random.normalvariate(8, 2)
-            elif diagnosis == "A3":
-                duration = random.normalvariate(16, 2)
-            elif diagnosis == "A4":
-                duration = random.normalvariate(16, 2)
-            elif diagnosis == "B1":
-                duration = random.normalvariate(8, 2)
-            elif diagnosis == "B2":
-                duration = random.normalvariate(16, 2)
-            elif diagnosis == "B3":
-                duration = random.normalvariate(16, 4)
-            elif diagnosis == "B4":
-                duration = random.normalvariate(16, 4)
-            nursing_finish_time = simulation_time + max(0, duration)
-            release_time = self.next_release_time(nursing_finish_time)
-            duration_until_release = release_time - simulation_time
-            return duration_until_release
-        else:
-            raise ValueError("Unknown task label", task.element_label)
-        
+        label = task.label
+        key = (label, self.get_case_data(task.case_id)["diagnosis"] if label in self.DIAGNOSIS_TASKS else None)
+        duration = max(0, self.processing_time_sampler.sample(key))
+        if label == HealthcareElements.NURSING:
+            release_time = self.next_release_time(simulation_time + duration)
+            return release_time - simulation_time  # duration until release
+        return duration
+
     def complication(self, task):
         diagnosis = self.get_case_data(task.case_id)["diagnosis"]
-        r = random.random()
-        if diagnosis in ["A1", "A2", "B2"]:
-            return r < 0.01
-        elif diagnosis in ["A3", "A4", "B3", "B4"]:
-            return r < 0.02
-        elif diagnosis in ["B1"]:
-            return r < 0.001
-        elif diagnosis == "EM":
-            return False
-        else:
+        if diagnosis not in self.complication_probabilities:
             raise ValueError("Unknown Diagnosis", diagnosis)
+        return self.complication_sampler.sample(diagnosis) < self.complication_probabilities[diagnosis]
         
     def next_release_time(self, current_time):
-        release_times = [8, 13, 18]
-        if current_time % 72 <= max(release_times):
-            # release today
-            valid_release_offsets = filter(lambda k : k >= 0,
-                                   [release_time - (current_time % 72) for release_time in release_times]
-            )
-            return current_time + min(valid_release_offsets)
-        else:
-            # release next day
-            return current_time + (72 - current_time % 72) + min(release_times)
+        return self.RELEASE_TIMES.next_moment(current_time)
         
+    def generate_arrivals(self, running_time):
+        """
+        Generates the arrival times, case types and diagnoses of the cases that arrive until the given time,
+        as they arrive in a simulation of a problem with the same seed and configuration, without creating the cases.
+        :return: an iterator of (arrival time, case type, diagnosis or None) tuples in the order of arrival that can be passed to ArrivalTrace.write.
+        """
+        problem = type(self)(seed=self.seed, configuration=self.configuration)
+        while True:
+            (case_type, arrival_time, case_id) = problem.next_case_type()
+            del problem.case_type[case_id]
+            if arrival_time > running_time:
+                return
+            yield (arrival_time, case_type, problem.diagnosis_sampler.sample(case_type))
+
     def next_case(self):
-        case_type, arrival_time, case_id = self.next_case_type()
+        if self.arrival_trace is None:
+            case_type, arrival_time, case_id = self.next_case_type()
+        elif self.arrival_position < len(self.arrival_trace):
+            (arrival_time, case_type, diagnosis) = self.arrival_trace[self.arrival_position]
+            self.arrival_position += 1
+            case_id = self.next_case_id
+            self.next_case_id += 1
+            self.case_type[case_id] = case_type
+        else:
+            return (None, None)
 
         if case_type == "EM":
             next_label = HealthcareElements.EMERGENCY_PATIENT
@@ -503,117 +1079,120 @@ class HealthcareProblem(Problem):
             next_element_type = ElementType.EVENT
         
         initial_element = Element(case_id, case_type, self.get_unique_element_id(), next_label, next_element_type, occurrence_time=arrival_time)
-        self.add_data(initial_element, self.data_sample(initial_element))
+        self.add_data(initial_element, self.data_sample(initial_element) if self.arrival_trace is None else {"diagnosis": diagnosis})
 
         return arrival_time, initial_element
     
     def complete_element(self, element):
-        simulator_time = self.simulator.now
-        next_label = None
-        next_element_occurrence_time = None
-        if element.label == HealthcareElements.PATIENT_REFERAL:
-            # Afer referral, (1) the TIME_FOR_INTAKE can be planned
-            # and (2) the patient can leave due to long wait
-            self.add_can_plan(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
-            next_label = HealthcareElements.PATIENT_LEFT_DUE_TO_LONG_WAIT
-            next_element_type = ElementType.EVENT
-            next_element_occurrence_time = simulator_time + 7*24
-
-        elif element.label == HealthcareElements.TIME_FOR_INTAKE:
-            # Only proceed to intake when there are no more than 2 persons done with intake
-            # and the intake is staffed
-            # else: replan
-
-            if self.resources_idle(ResourceType.INTAKE, simulator_time) \
-               and len(self.patients_after_intake) < 2:
-                next_label = HealthcareElements.INTAKE
-                next_element_type = ElementType.TASK
-                self.simulator.cancel(element.case_id, HealthcareElements.PATIENT_LEFT_DUE_TO_LONG_WAIT)
-            else:
-                # remove old 'time for intake' and create new one
-                self.add_can_plan(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
-
-        elif element.label == HealthcareElements.PATIENT_LEFT_DUE_TO_LONG_WAIT:
-            # After the patient left due to long wait, the case is closed
-            if element.case_id in self.can_plan:
-                self.remove_can_plan(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
-            self.simulator.cancel(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
-            next_label = None
-
-        elif element.label == HealthcareElements.INTAKE:
-            # After intake, the surgery / nursing happens
-            self.simulator.cancel(element.case_id, HealthcareElements.PATIENT_LEFT_DUE_TO_LONG_WAIT)
-            self.simulator.cancel(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
-
-            self.patients_after_intake.append(element.case_id)
-            diagnosis = self.get_case_data(element.case_id)["diagnosis"]
-            if diagnosis in ["A2", "A3", "A4", "B3", "B4"]:
-                next_label = HealthcareElements.SURGERY
-                next_element_type = ElementType.TASK
-            elif diagnosis in ["A1", "B1", "B2"]:
-                next_label = HealthcareElements.NURSING
-                next_element_type = ElementType.TASK
-            else:
-                raise ValueError("Unknown diagnosis", diagnosis)
-            
-        elif element.label == HealthcareElements.SURGERY:
-            # afer surgery the nursing happens
-            next_label = HealthcareElements.NURSING
-            next_element_type = ElementType.TASK
-
-
-        elif element.label == HealthcareElements.EMERGENCY_PATIENT:
-            # after an ER patient has arrived he will receive ER treatment
-            next_label = HealthcareElements.ER_TREATMENT
-            next_element_type = ElementType.TASK
-
-        elif element.label == HealthcareElements.ER_TREATMENT:
-            # after the patient has received ER treatment he will either be
-            # sent home, or will further be processed
-            diagnosis = self.get_case_data(element.case_id)["diagnosis"]
-            if diagnosis == None:
-                # release patient right away
-                next_label = HealthcareElements.RELEASING
-                next_element_type = ElementType.EVENT
-                next_element_occurrence_time = simulator_time
-            else:
-                self.er_treatment_finished[element.case_id] = simulator_time
-                if diagnosis in ["A2", "A3", "A4", "B3", "B4"]:
-                    next_label = HealthcareElements.SURGERY
-                    next_element_type = ElementType.TASK
-                elif diagnosis in ["A1", "B1", "B2"]:
-                    next_label = HealthcareElements.NURSING
-                    next_element_type = ElementType.TASK
-
-        elif element.label == HealthcareElements.NURSING:
-            # after nursing has been completed the patient will
-            # either be released, or get another treatment when
-            # a complication has arised
-            if self.complication(element):
-                diagnosis = self.get_case_data(element.case_id)["diagnosis"]
-                # If diagnosis is A1, B1, B2 patients do not need new surgery
-                if diagnosis in ["A1", "B1", "B2"]:
-                    next_label = HealthcareElements.NURSING
-                else:
-                    next_label = HealthcareElements.SURGERY
-                next_element_type = ElementType.TASK
-            else:
-                # release patient at batch release time
-                next_label = HealthcareElements.RELEASING
-                next_element_type = ElementType.EVENT
-                next_element_occurrence_time = self.next_release_time(simulator_time)
-
-        elif element.label == HealthcareElements.RELEASING:
-            next_label = None
-
-        if next_label is not None:
-            new_element = Element(element.case_id, element.case_type, self.get_unique_element_id(), next_label, next_element_type, occurrence_time=next_element_occurrence_time)
-            #self.add_data(new_element, self.get_case_data(element.case_id))
-            #self.add_data(new_element,  self.data_sample(new_element))
+        handler = self.COMPLETION_HANDLERS.get(element.label)
+        next_element = handler(self, element, self.simulator.now) if handler is not None else None
+        if next_element is not None:
+            (next_label, next_element_type, next_element_occurrence_time) = next_element
+            new_element = Element(element.case_id, element.case_type, self.get_unique_element_id(), next_label, next_element_type, occurrence_time=next_element_occurrence_time, data=self.get_case_data(element.case_id))
             return [new_element]
         
         return []
 
+    # The completion handlers below each complete an element with a certain label
+    # and return (label, element type, occurrence time) of the next element of the case, or None if there is no next element.
+
+    def __complete_patient_referal(self, element, simulator_time):
+        # Afer referral, (1) the TIME_FOR_INTAKE can be planned
+        # and (2) the patient can leave due to long wait
+        self.add_can_plan(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
+        return (HealthcareElements.PATIENT_LEFT_DUE_TO_LONG_WAIT, ElementType.EVENT, simulator_time + 7*24)
+
+    def __complete_time_for_intake(self, element, simulator_time):
+        # Only proceed to intake when there are no more than 2 persons done with intake
+        # and the intake is staffed
+        # else: replan
+
+        self.release_planning_slot(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
+        # a patient that comes for intake more than once was sent home before, all of their TIME_FOR_INTAKE events count
+        count = self.time_for_intake_count.get(element.case_id, 0) + 1
+        self.time_for_intake_count[element.case_id] = count
+        if count == 2:
+            self.sent_home_count += 2
+        elif count > 2:
+            self.sent_home_count += 1
+
+        if self.resources_idle(ResourceType.INTAKE, simulator_time) \
+           and len(self.patients_after_intake) < 2:
+            self.simulator.cancel(element.case_id, HealthcareElements.PATIENT_LEFT_DUE_TO_LONG_WAIT)
+            return (HealthcareElements.INTAKE, ElementType.TASK, None)
+        # remove old 'time for intake' and create new one
+        self.add_can_plan(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
+        return None
+
+    def __complete_patient_left_due_to_long_wait(self, element, simulator_time):
+        # After the patient left due to long wait, the case is closed
+        self.time_for_intake_count.pop(element.case_id, None)
+        if element.case_id in self.can_plan:
+            self.remove_can_plan(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
+        self.simulator.cancel(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
+        self.release_planning_slot(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
+        return None
+
+    def __complete_intake(self, element, simulator_time):
+        # After intake, the surgery / nursing happens
+        self.simulator.cancel(element.case_id, HealthcareElements.PATIENT_LEFT_DUE_TO_LONG_WAIT)
+        self.simulator.cancel(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
+        self.release_planning_slot(element.case_id, HealthcareElements.TIME_FOR_INTAKE)
+        self.time_for_intake_count.pop(element.case_id, None)
+
+        self.patients_after_intake.append(element.case_id)
+        diagnosis = self.get_case_data(element.case_id)["diagnosis"]
+        if diagnosis not in self.treatments:
+            raise ValueError("Unknown diagnosis", diagnosis)
+        return (self.treatments[diagnosis], ElementType.TASK, None)
+
+    def __complete_surgery(self, element, simulator_time):
+        # afer surgery the nursing happens
+        return (HealthcareElements.NURSING, ElementType.TASK, None)
+
+    def __complete_emergency_patient(self, element, simulator_time):
+        # after an ER patient has arrived he will receive ER treatment
+        return (HealthcareElements.ER_TREATMENT, ElementType.TASK, None)
+
+    def __complete_er_treatment(self, element, simulator_time):
+        # after the patient has received ER treatment he will either be
+        # sent home, or will further be processed
+        diagnosis = self.get_case_data(element.case_id)["diagnosis"]
+        if diagnosis == None:
+            # release patient right away
+            return (HealthcareElements.RELEASING, ElementType.EVENT, simulator_time)
+        self.er_waiting_since[element.case_id] = simulator_time
+        if diagnosis in self.treatments:
+            return (self.treatments[diagnosis], ElementType.TASK, None)
+        return None
+
+    def __complete_nursing(self, element, simulator_time):
+        # after nursing has been completed the patient will
+        # either be released, or get another treatment when
+        # a complication has arised
+        if self.complication(element):
+            # patients whose treatment is nursing do not need new surgery
+            return (self.treatments[self.get_case_data(element.case_id)["diagnosis"]], ElementType.TASK, None)
+        # release patient at batch release time
+        return (HealthcareElements.RELEASING, ElementType.EVENT, self.next_release_time(simulator_time))
+
+    def __complete_releasing(self, element, simulator_time):
+        self.released_count += 1
+        return None
+
+    # element label -> completion handler of elements with that label
+    COMPLETION_HANDLERS = {
+        HealthcareElements.PATIENT_REFERAL: __complete_patient_referal,
+        HealthcareElements.TIME_FOR_INTAKE: __complete_time_for_intake,
+        HealthcareElements.PATIENT_LEFT_DUE_TO_LONG_WAIT: __complete_patient_left_due_to_long_wait,
+        HealthcareElements.INTAKE: __complete_intake,
+        HealthcareElements.SURGERY: __complete_surgery,
+        HealthcareElements.EMERGENCY_PATIENT: __complete_emergency_patient,
+        HealthcareElements.ER_TREATMENT: __complete_er_treatment,
+        HealthcareElements.NURSING: __complete_nursing,
+        HealthcareElements.RELEASING: __complete_releasing
+    }
+
     def start_task(self, element):
         # keeps track of the patients after intake, and
         # the times when surgery/nurisng of er patients has started (used for evaluation)
@@ -621,49 +1200,42 @@ class HealthcareProblem(Problem):
             element.label == HealthcareElements.NURSING:
             if element.case_id in self.patients_after_intake:
                 self.patients_after_intake.remove(element.case_id)
-            if element.case_type == 'EM' and element.case_id not in self.er_surgery_nursing_started:
-                self.er_surgery_nursing_started[element.case_id] = self.simulator.now
+            if element.case_type == 'EM' and element.case_id in self.er_waiting_since:
+                er_treatment_finished = self.er_waiting_since.pop(element.case_id)
+                self.er_excessive_wait += self.excessive_er_wait(self.simulator.now - er_treatment_finished)
+
+    @staticmethod
+    def excessive_er_wait(wait):
+        """
+        Returns the penalty for waiting the given time after ER treatment until surgery / nursing starts, which is quadratic in the time beyond 4 hours.
+        """
+        return 0 if wait < 4 else (wait - 4)**2
 
     def evaluate(self):
         """
-        Evaluates the performance of the planning algorithm
+        Evaluates the performance of the planning algorithm.
+        The scores are kept up to date during the simulation, so they can also be evaluated before the end of a run.
         """
         er_treatment_duration_factor = 20
         sent_home_factor = 500
         processed_factor = 5000
 
-        unfinished_cases = 0
-        for busy_case in self.simulator.busy_cases:  
-            if busy_case in self.simulator.case_start_times:
-                start_time = self.simulator.case_start_times[busy_case]
-                if start_time <= self.simulator.now:
-                    unfinished_cases += 1
-        
+        # busy cases are created upon CASE_ARRIVAL, so each of them has started and is not yet finalized
+        unfinished_cases = len(self.simulator.busy_cases)
+
         cases_started = self.simulator.finalized_cases + unfinished_cases
 
         # Penality for patients that wait longer than 5 hours after ER treatment
-        # until they get processed with Nursing/Surgery
-        er_treatment_2_processing = [
-            (self.er_surgery_nursing_started[case_id] if case_id in self.er_surgery_nursing_started else self.simulator.now)
-               - er_treatment_finished
-               for case_id, er_treatment_finished in self.er_treatment_finished.items()]
-        er_treatment_2_processing_excessive = [0 if t < 4 else (t-4)**2 for t in er_treatment_2_processing]
-
-        er_treatment_score = sum(er_treatment_2_processing_excessive) / cases_started * er_treatment_duration_factor
+        # until they get processed with Nursing/Surgery, including the patients that are still waiting
+        er_excessive_wait = self.er_excessive_wait + sum(
+            self.excessive_er_wait(self.simulator.now - er_treatment_finished) for er_treatment_finished in self.er_waiting_since.values())
+        er_treatment_score = er_excessive_wait / cases_started * er_treatment_duration_factor
 
         # patients sent home
-        time_for_intake = dict(filter(lambda k : k[0].label == HealthcareElements.TIME_FOR_INTAKE,
-                                self.simulator.event_times.items()))
-        time_for_intake_cases = [t[0].case_id for t in time_for_intake.items()]
-        intake_count = collections.Counter(time_for_intake_cases)
-        sent_home_count = sum(filter(lambda k : k > 1, intake_count.values()))
-        sent_home_score = sent_home_count / cases_started * sent_home_factor
+        sent_home_score = self.sent_home_count / cases_started * sent_home_factor
 
         # patients processed
-        released = len(list(filter(lambda k : k[0].label == HealthcareElements.RELEASING,
-                                self.simulator.event_times.items())))
-        processed_score = (cases_started - released) * processed_factor / cases_started
-
+        processed_score = (cases_started - self.released_count) * processed_factor / cases_started
 
         return {
             'er_treatment_score' : er_treatment_score,
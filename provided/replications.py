@@ -0,0 +1,92 @@
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist, mean, stdev
+
+from simulator import Simulator
+from problems import HealthcareProblem
+
+
+def run_replication(planner_factory, seed, running_time, configuration=None):
+    """
+    Runs a single replication of the simulation.
+    :param planner_factory: a picklable callable without arguments that returns a new planner, e.g. a planner class.
+    :param seed: the seed of the replication, used for the random number streams of the problem and for the global random module that planners may use.
+    :param running_time: the simulated time in hours.
+    :param configuration: the configuration of the hospital, see HealthcareProblem. If None, HealthcareProblem.CONFIGURATION is used.
+    :return: the result of HealthcareProblem.evaluate() for the replication.
+    """
+    random.seed(seed)
+    simulator = Simulator(planner_factory(), HealthcareProblem(seed=seed, configuration=configuration))
+    return simulator.run(running_time)
+
+
+def run_replications(planner_factory, replications, running_time=365*24, seed=0, processes=None, configuration=None):
+    """
+    Runs independently seeded replications of the simulation in parallel, one process per replication at a time.
+    Replication i is seeded with seed + i, so the same seed gives the same set of replications,
+    and two planners run with the same seed are compared on the same arrivals, case types and diagnoses (common random numbers),
+    but not on the same processing times and complications, see HealthcareProblem.
+    :param planner_factory: a picklable callable without arguments that returns a new planner, e.g. a planner class.
+        The planner must not write to shared files, because replications run concurrently.
+    :param replications: the number of replications.
+    :param running_time: the simulated time in hours of each replication.
+    :param seed: the seed of the first replication.
+    :param processes: the number of worker processes, by default the number of CPUs.
+    :param configuration: the configuration of the hospital, see HealthcareProblem. If None, HealthcareProblem.CONFIGURATION is used.
+    :return: a list with the result of HealthcareProblem.evaluate() for each replication, in the order of the seeds.
+    """
+    seeds = [seed + i for i in range(replications)]
+    if processes is None:
+        processes = os.cpu_count()
+    processes = min(processes, replications)
+    if processes <= 1:
+        return [run_replication(planner_factory, s, running_time, configuration) for s in seeds]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(run_replication, [planner_factory] * replications, seeds, [running_time] * replications, [configuration] * replications))
+
+
+def t_quantile(p, degrees_of_freedom):
+    """
+    Returns the p-quantile of the Student t-distribution.
+    Exact for one and two degrees of freedom, otherwise the Cornish-Fisher expansion around the normal quantile,
+    which is accurate to within 1% from three degrees of freedom on.
+    """
+    v = degrees_of_freedom
+    if v == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if v == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    return (z
+            + (z**3 + z) / (4 * v)
+            + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * v**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * v**3)
+            + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * v**4))
+
+
+def summarize(results, confidence=0.95):
+    """
+    Aggregates the results of replications per key of HealthcareProblem.evaluate().
+    :param results: a list of dictionaries as returned by HealthcareProblem.evaluate().
+    :param confidence: the confidence level of the confidence intervals.
+    :return: a dictionary of key -> dictionary with the number of replications 'n', the 'mean', the sample standard deviation 'std'
+        and the bounds 'ci_low' and 'ci_high' of the t-based confidence interval of the mean.
+        With a single replication the standard deviation and the bounds of the interval are NaN, because the variance cannot be estimated.
+    """
+    summary = dict()
+    for key in results[0]:
+        values = [result[key] for result in results]
+        n = len(values)
+        average = mean(values)
+        deviation = stdev(values) if n > 1 else math.nan
+        half_width = t_quantile(1 - (1 - confidence) / 2, n - 1) * deviation / math.sqrt(n) if n > 1 else math.nan
+        summary[key] = {
+            'n': n,
+            'mean': average,
+            'std': deviation,
+            'ci_low': average - half_width,
+            'ci_high': average + half_width
+        }
+    return summary
@@ -1,5 +1,10 @@
 from enum import Enum, auto
+import heapq
+import copy
 from plannerhelper import PlannerHelper
+from planners import IncrementalPlanner
+from problems import CyclicCalendar, Element
+from checkpoint import CheckpointWriter, CheckpointReader, class_path, load_class
 
 class EventType(Enum):
 	CASE_ARRIVAL = auto()
@@ -16,6 +21,8 @@ class EventType(Enum):
 
 
 class SimulationEvent:
+	__slots__ = ("event_type", "moment", "element", "resource")
+
 	def __init__(self, event_type, moment, element, resource=None):
 		self.event_type = event_type
 		self.moment = moment
@@ -29,35 +36,228 @@ class SimulationEvent:
 		return str(self.event_type) + "\t(" + str(round(self.moment, 2)) + ")\t" + str(self.element) + "," + str(self.resource)
 
 
+class EventQueue:
+	"""
+	A priority queue of (moment, SimulationEvent) tuples backed by a binary heap.
+	Events are popped by moment. At the same moment tasks are started (i.e. resources are used) before another COMPLETE_EVENT comes into action.
+	Events with equal keys are popped in the order in which they were pushed.
+	Queued COMPLETE_EVENT events are indexed by (case_id, element label), so that they can be cancelled in O(1).
+	Cancelled events stay in the heap as dead entries and are skipped when they are popped.
+	Heap entries are never changed, so a copy of the queue can share them.
+	"""
+	def __init__(self):
+		self.heap = []  # heap of (moment, priority, sequence number, simulationevent)
+		self.sequence = 0  # number of events pushed so far, used as FIFO tie-break
+		self.index = dict()  # dictionary of (case_id, element label) -> heap entry of the queued COMPLETE_EVENT for that element
+		self.cancelled = set()  # set of sequence numbers of cancelled entries that are still in the heap
+		self.live = 0  # number of entries in the heap that are not cancelled
+
+	def push(self, moment, event):
+		priority = 1 if event.event_type == EventType.COMPLETE_EVENT else 0
+		entry = (moment, priority, self.sequence, event)
+		heapq.heappush(self.heap, entry)
+		self.sequence += 1
+		self.live += 1
+		if event.event_type == EventType.COMPLETE_EVENT:
+			self.index[(event.element.case_id, event.element.label)] = entry
+
+	def pop(self):
+		"""
+		Removes and returns the next (moment, SimulationEvent) tuple, skipping cancelled entries.
+		"""
+		while True:
+			entry = heapq.heappop(self.heap)
+			if entry[2] not in self.cancelled:
+				break
+			self.cancelled.remove(entry[2])
+		(moment, _, _, event) = entry
+		self.live -= 1
+		if event.event_type == EventType.COMPLETE_EVENT:
+			key = (event.element.case_id, event.element.label)
+			if self.index.get(key) is entry:
+				del self.index[key]
+		return (moment, event)
+
+	def cancel(self, case_id, element_label):
+		"""
+		Cancels the queued COMPLETE_EVENT for the element of the case with the given label.
+		:return: the cancelled (moment, SimulationEvent) tuple, or None if there is no such event queued.
+		"""
+		entry = self.index.pop((case_id, element_label), None)
+		if entry is None:
+			return None
+		self.cancelled.add(entry[2])
+		self.live -= 1
+		return (entry[0], entry[3])
+
+	def copy(self):
+		"""
+		Returns a copy of the queue that shares the heap entries and thereby the queued events.
+		"""
+		queue = copy.copy(self)
+		queue.heap = list(self.heap)
+		queue.index = dict(self.index)
+		queue.cancelled = set(self.cancelled)
+		return queue
+
+	def __len__(self):
+		return self.live
+
+	def __iter__(self):
+		"""
+		Iterates over the queued (moment, SimulationEvent) tuples in heap order, not in pop order.
+		"""
+		for (moment, _, sequence, event) in self.heap:
+			if sequence not in self.cancelled:
+				yield (moment, event)
+
+
+class CoalescingEventQueue(EventQueue):
+	"""
+	An event queue that merges an ASSIGN_RESOURCES or PLAN_EVENTS pass into a pending pass of the same type at the same moment.
+	A pass is only merged if no event that can change the outcome of the pass is queued between the pending pass and the new one,
+	so the pending pass sees the same state as the merged pass would have and simulation results do not change.
+	This does not guarantee at most one pass of a type per moment: a pass that is requested after such an event still runs.
+	Merging all passes of a moment into one would let the pass see state that the passes it replaces did not see, which changes results.
+	The bookkeeping costs time on every push, so coalescing only pays off when passes are expensive, e.g. with a planner that plans all elements
+	on every pass; with the cheap passes of the coalesce benchmark it is slower, see Simulator.
+	"""
+	# event types that, when queued for the moment of a pending pass, may change its outcome
+	BARRIERS = {
+		EventType.ASSIGN_RESOURCES: {EventType.CASE_ARRIVAL, EventType.COMPLETE_TASK, EventType.COMPLETE_EVENT, EventType.SCHEDULE_RESOURCES},
+		# everything that is reported to the planner or changes what the planner can observe
+		EventType.PLAN_EVENTS: {EventType.CASE_ARRIVAL, EventType.START_TASK, EventType.COMPLETE_TASK, EventType.COMPLETE_EVENT, EventType.COMPLETE_CASE, EventType.SCHEDULE_RESOURCES, EventType.ASSIGN_RESOURCES}
+	}
+
+	def __init__(self):
+		super().__init__()
+		self.pending = dict()  # dictionary of pass event type -> (moment, simulationevent) of the pending pass that new passes can be merged into
+		self.coalesced = {event_type: 0 for event_type in self.BARRIERS}  # dictionary of pass event type -> number of passes that were merged
+
+	def push(self, moment, event):
+		if event.event_type in self.pending and self.pending[event.event_type][0] == moment:
+			self.coalesced[event.event_type] += 1
+			return
+		super().push(moment, event)
+		if event.event_type in self.BARRIERS:
+			self.pending[event.event_type] = (moment, event)
+		if event.event_type != EventType.COMPLETE_EVENT:  # a COMPLETE_EVENT comes after all passes at the same moment
+			for pass_type, barriers in self.BARRIERS.items():
+				if event.event_type in barriers and pass_type in self.pending and self.pending[pass_type][0] == moment:
+					del self.pending[pass_type]
+
+	def pop(self):
+		(moment, event) = super().pop()
+		if event.event_type in self.pending and self.pending[event.event_type][1] is event:
+			del self.pending[event.event_type]
+		return (moment, event)
+
+	def copy(self):
+		queue = super().copy()
+		queue.pending = dict(self.pending)
+		queue.coalesced = dict(self.coalesced)
+		return queue
+
+
+class TaskQueue:
+	"""
+	The tasks that wait for a resource of one type.
+	Iterating over the queue yields the tasks in order of priority, lowest first, and tasks with the same priority in the order in which they were added.
+	"""
+	def __init__(self):
+		self.tasks = dict()  # dictionary of priority -> dictionary of task id -> task, in the order in which the tasks were added
+		self.keys = dict()  # dictionary of task id -> (priority, sequence number of the task)
+
+	def add(self, task, priority, sequence):
+		"""
+		Adds a task with the given priority. The sequence number orders the task among tasks with the same priority in all queues.
+		"""
+		if priority not in self.tasks:
+			self.tasks[priority] = dict()
+			self.tasks = dict(sorted(self.tasks.items()))
+		self.tasks[priority][task.id] = task
+		self.keys[task.id] = (priority, sequence)
+
+	def remove(self, task_id):
+		(priority, _) = self.keys.pop(task_id)
+		del self.tasks[priority][task_id]
+
+	def key(self, task_id):
+		"""
+		Returns the (priority, sequence number) of the task, by which tasks from different queues can be ordered.
+		"""
+		return self.keys[task_id]
+
+	def copy(self):
+		queue = TaskQueue()
+		queue.tasks = {priority: dict(tasks) for priority, tasks in self.tasks.items()}
+		queue.keys = dict(self.keys)
+		return queue
+
+	def __len__(self):
+		return len(self.keys)
+
+	def __iter__(self):
+		for tasks in self.tasks.values():
+			yield from tasks.values()
+
+
 class Simulator:
-	def __init__(self, planner, problem):
-		self.events = []  # list of tuples (planned moment, simulationevent)
+	# planning slots are every half hour between 8:00 and 15:00 (inclusive)
+	PLANNING_SLOTS = CyclicCalendar(24, moments=[8 + half_hour / 2 for half_hour in range(15)])
+	# the planning slots as hour of the day multiplied by 10
+	PLANNING_SLOTS_X_10 = frozenset(round(moment * 10) for moment in PLANNING_SLOTS.moments)
+
+	def __init__(self, planner, problem, coalesce=False, keep_history=False):
+		"""
+		:param coalesce: if True, ASSIGN_RESOURCES and PLAN_EVENTS passes are merged into a pending pass of the same type at the same moment, see CoalescingEventQueue.
+			This is off by default: over 720 hours with the benchmark planner it merges 1387 assignment and 2323 planning passes,
+			but takes 0.15 s instead of 0.13 s, because those passes are cheap.
+		:param keep_history: if True, the start and end times of all tasks, the completion times of all events and the start times of finalized cases are kept.
+			They are not needed for evaluation, which is done with running scores, so by default they are not kept.
+		"""
+		self.coalesce = coalesce
+		self.keep_history = keep_history
+		self.events = CoalescingEventQueue() if coalesce else EventQueue()  # priority queue of tuples (planned moment, simulationevent)
 		self.unassigned_tasks = dict()  # dictionary of unassigned tasks id -> task
+		self.waiting_tasks = dict()  # dictionary of resource type -> TaskQueue of the unassigned tasks that need a resource of that type
+		self.tasks_queued = 0  # number of tasks that have been added to the waiting tasks, used as sequence number
 		self.assigned_tasks = dict()  # dictionary of assigned tasks id -> (task, resource, moment of assignment)
 		self.available_resources = set()  # set of available resources
+		self.free_resources = dict()  # dictionary of resource type -> dictionary of available resources of that type -> None, in the order in which they became available, which forks keep
 		self.away_resources = []  # list of resources that are unavailable, because they are away
+		self.away_counts = dict()  # dictionary of resource type -> number of away resources of that type
+		self.resource_totals = dict()  # dictionary of resource type -> number of resources of that type in the problem
 		self.busy_resources = dict()  # dictionary of busy resources resource -> (task they are busy on, moment they started on the task)
-		self.busy_cases = dict()  # dictionary of busy cases case_id -> list of ids of elements that are planned in self.events for the case
+		self.availability_changes = dict()  # dictionary of moment -> list of resources of which the availability changes at that moment
+		self.busy_cases = dict()  # dictionary of busy cases case_id -> set of ids of elements that are planned in self.events for the case
 		self.now = 0  # current moment in the simulation
 		self.finalized_cases = 0  # number of cases that have been finalized
 		self.total_cycle_time = 0  # sum of cycle times of finalized cases
-		self.case_start_times = dict()  # dictionary of case_id -> moment the case started
-		self.task_start_end_times = dict()
-		self.event_times = dict()
+		self.case_start_times = dict()  # dictionary of case_id -> moment the case started, for busy cases and, with keep_history, for finalized cases
+		self.task_start_end_times = dict()  # dictionary of task -> (moment the task started, moment the task completed or 0), only filled with keep_history
+		self.event_times = dict()  # dictionary of event -> moment the event completed, only filled with keep_history
 		self.problem = problem  # the problem to be simulated
 		self.planner = planner  # the planner to be used for planning events
 
 		planner.set_planner_helper(PlannerHelper(problem, self))
 		problem.set_simulator(self)
+		problem.track_can_plan_changes(isinstance(planner, IncrementalPlanner))
 		self.init_simulation()
 
 	def restart(self):
-		self.events = []
+		self.events = CoalescingEventQueue() if self.coalesce else EventQueue()
 		self.unassigned_tasks = dict()
+		self.waiting_tasks = dict()
+		self.tasks_queued = 0
 		self.assigned_tasks = dict()
 		self.available_resources = set()
+		self.free_resources = dict()
 		self.away_resources = []
+		self.away_counts = dict()
+		self.resource_totals = dict()
 		self.busy_resources = dict()
+		self.availability_changes = dict()
 		self.busy_cases = dict()
 		self.now = 0
 		self.finalized_cases = 0
@@ -69,59 +269,308 @@ class Simulator:
 		self.problem.restart()
 		self.init_simulation()
 
-	def sort_events(self):
-		"""
-		First start tasks (i.e. use resources) before another COMPLETE_EVENT comes into action
-		"""
-		self.events.sort(key = lambda k : (k[0], # time
-									 1 if k[1].event_type == EventType.COMPLETE_EVENT else
-									 0)
-		)
-
 	def init_simulation(self):
 		"""
 		Initializes the simulation by:
 		- setting the available resources to all resources in the problem
 		- adding the first case arrival event to the events list
 		- setting the first regular planning moment
+		- checking the availability of all resources at the start of the simulation
 		- restarting the problem
 		"""
 		for r in self.problem.resources:
-			self.available_resources.add(r)
+			if r.type not in self.free_resources:
+				self.free_resources[r.type] = dict()
+				self.away_counts[r.type] = 0
+				self.resource_totals[r.type] = 0
+			self.resource_totals[r.type] += 1
+			self.add_available_resource(r)
 		self.problem.restart()
 		(t, task) = self.problem.next_case()
-		self.events.append((t, SimulationEvent(EventType.CASE_ARRIVAL, t, task)))
+		if task is not None:
+			self.events.push(t, SimulationEvent(EventType.CASE_ARRIVAL, t, task))
 		next_planning_moment = self.problem.next_regular_planning_moment(0)
-		self.events.append((next_planning_moment, SimulationEvent(EventType.REGULAR_PLANNING_MOMENT, next_planning_moment, None)))
-		self.events.append((0, SimulationEvent(EventType.SCHEDULE_RESOURCES, 0, None)))
-		self.sort_events()
+		self.events.push(next_planning_moment, SimulationEvent(EventType.REGULAR_PLANNING_MOMENT, next_planning_moment, None))
+		self.availability_changes[0] = list(self.problem.resources)
+		self.events.push(0, SimulationEvent(EventType.SCHEDULE_RESOURCES, 0, None))
+
+	def add_available_resource(self, resource):
+		self.available_resources.add(resource)
+		self.free_resources[resource.type][resource] = None
+
+	def remove_available_resource(self, resource):
+		self.available_resources.remove(resource)
+		del self.free_resources[resource.type][resource]
+
+	def add_away_resource(self, resource):
+		self.away_resources.append(resource)
+		self.away_counts[resource.type] += 1
+
+	def remove_away_resource(self, resource):
+		self.away_resources.remove(resource)
+		self.away_counts[resource.type] -= 1
+
+	def resource_counts(self, resource_type):
+		"""
+		Returns the numbers of resources of the given type that are free, busy and away as a tuple (free, busy, away), in O(1).
+		Free resources are available and idle, busy resources are assigned to a task, also when they are off duty and will leave after the task,
+		and away resources are off duty and idle.
+		"""
+		free = len(self.free_resources.get(resource_type, ()))
+		away = self.away_counts.get(resource_type, 0)
+		return (free, self.resource_totals.get(resource_type, 0) - free - away, away)
+
+	def add_unassigned_task(self, task):
+		self.unassigned_tasks[task.id] = task
+		resource_type = self.problem.resource_type(task)
+		if resource_type not in self.waiting_tasks:
+			self.waiting_tasks[resource_type] = TaskQueue()
+		self.waiting_tasks[resource_type].add(task, self.problem.task_priority(task), self.tasks_queued)
+		self.tasks_queued += 1
+
+	def schedule_availability_change(self, resource):
+		"""
+		Schedules the next moment at which the availability of the resource changes, as published by the problem.
+		There is at most one SCHEDULE_RESOURCES event per moment, for all resources that change at that moment.
+		"""
+		moment = self.problem.next_availability_change(resource, self.now)
+		if moment is None:
+			return
+		if moment not in self.availability_changes:
+			self.availability_changes[moment] = []
+			self.events.push(moment, SimulationEvent(EventType.SCHEDULE_RESOURCES, moment, None))
+		self.availability_changes[moment].append(resource)
 
 	def cancel(self, case_id, event_label):
 		"""
 		Cancels an event for a case with a certain label by removing it from the events list.
 		"""
-		found_index = None
-		for i in range(len(self.events)):
-			if self.events[i][1].element is not None and self.events[i][1].element.case_id == case_id and self.events[i][1].element.label == event_label:
-				found_index = i
-		if found_index is not None:
-			event = self.events.pop(found_index)
+		cancelled = self.events.cancel(case_id, event_label)
+		if cancelled is not None:
 			# also remove the element from the busy case
-			self.busy_cases[case_id] = list(filter(
-				lambda k : k.id != event[1].element.id,
-				self.busy_cases[case_id]
-			))
+			self.busy_cases[case_id].discard(cancelled[1].element.id)
+
+	def fork(self, planner, seed=None):
+		"""
+		Returns a copy of the simulator and its problem in their current state, which can be run independently of this simulator,
+		e.g. to roll the future forward under a candidate plan.
+		Only mutable state is copied. Elements, simulation events, resources and case data are shared, because they do not change once they are created.
+		:param planner: the planner of the fork. It must be another instance than the planner of this simulator, because it gets a planner helper for the fork.
+		:param seed: if None, the random number streams of the fork continue from a copy of their current state, so the fork sees the same future arrivals and durations.
+			Otherwise, the streams of the fork are reseeded with the given seed.
+		"""
+		fork = Simulator.__new__(Simulator)
+		fork.coalesce = self.coalesce
+		fork.keep_history = self.keep_history
+		fork.events = self.events.copy()
+		fork.unassigned_tasks = dict(self.unassigned_tasks)
+		fork.waiting_tasks = {resource_type: tasks.copy() for resource_type, tasks in self.waiting_tasks.items()}
+		fork.tasks_queued = self.tasks_queued
+		fork.assigned_tasks = dict(self.assigned_tasks)
+		fork.available_resources = set(self.available_resources)
+		fork.free_resources = {resource_type: dict(resources) for resource_type, resources in self.free_resources.items()}
+		fork.away_resources = list(self.away_resources)
+		fork.away_counts = dict(self.away_counts)
+		fork.resource_totals = self.resource_totals
+		fork.busy_resources = dict(self.busy_resources)
+		fork.availability_changes = {moment: list(resources) for moment, resources in self.availability_changes.items()}
+		fork.busy_cases = {case_id: set(element_ids) for case_id, element_ids in self.busy_cases.items()}
+		fork.now = self.now
+		fork.finalized_cases = self.finalized_cases
+		fork.total_cycle_time = self.total_cycle_time
+		fork.case_start_times = dict(self.case_start_times)
+		fork.task_start_end_times = dict(self.task_start_end_times)
+		fork.event_times = dict(self.event_times)
+		fork.problem = self.problem.fork(fork, seed)
+		fork.planner = planner
+		planner.set_planner_helper(PlannerHelper(fork.problem, fork))
+		fork.problem.track_can_plan_changes(isinstance(planner, IncrementalPlanner))
+		return fork
+
+	def save_checkpoint(self, filename):
+		"""
+		Writes the full state of the simulator and its problem to a binary checkpoint file, see checkpoint.py.
+		The simulation can be resumed from the file with from_checkpoint, without running it again up to now.
+		The planner is not part of the checkpoint.
+		"""
+		checkpoint = CheckpointWriter()
+		resource_rows = {resource: row for row, resource in enumerate(self.problem.resources)}
+		def resource_row(resource):
+			return -1 if resource is None else resource_rows[resource]
+		checkpoint.document("simulator", {
+			"problem_class": class_path(type(self.problem)),
+			"resources": [resource.id for resource in self.problem.resources],
+			"coalesce": self.coalesce,
+			"keep_history": self.keep_history,
+			"now": self.now,
+			"finalized_cases": self.finalized_cases,
+			"total_cycle_time": self.total_cycle_time,
+			"tasks_queued": self.tasks_queued,
+			"sequence": self.events.sequence,
+			"live": self.events.live
+		})
+		# the event queue, in heap order
+		heap = self.events.heap
+		checkpoint.numbers("events/moment", [entry[0] for entry in heap])
+		checkpoint.column("events/priority", "b", [entry[1] for entry in heap])
+		checkpoint.column("events/sequence", "q", [entry[2] for entry in heap])
+		checkpoint.coded("events/event_type", [entry[3].event_type for entry in heap])
+		checkpoint.numbers("events/event_moment", [entry[3].moment for entry in heap])
+		checkpoint.column("events/element", "q", [checkpoint.element_row(entry[3].element) for entry in heap])
+		checkpoint.column("events/resource", "q", [resource_row(entry[3].resource) for entry in heap])
+		checkpoint.column("events/cancelled", "q", self.events.cancelled)
+		checkpoint.column("events/indexed", "q", [entry[2] for entry in self.events.index.values()])
+		if self.coalesce:
+			sequences = {id(entry[3]): entry[2] for entry in heap}
+			checkpoint.coded("events/pending/event_type", self.events.pending.keys())
+			checkpoint.column("events/pending/sequence", "q", [sequences[id(event)] for (_, event) in self.events.pending.values()])
+			checkpoint.coded("events/coalesced/event_type", self.events.coalesced.keys())
+			checkpoint.column("events/coalesced/count", "q", self.events.coalesced.values())
+		# the tasks
+		checkpoint.column("unassigned_tasks", "q", [checkpoint.element_row(task) for task in self.unassigned_tasks.values()])
+		waiting = [(resource_type, task_id, key) for resource_type, queue in self.waiting_tasks.items() for task_id, key in queue.keys.items()]
+		checkpoint.coded("waiting_tasks/resource_type", [resource_type for (resource_type, _, _) in waiting])
+		checkpoint.column("waiting_tasks/element", "q", [checkpoint.element_row(self.unassigned_tasks[task_id]) for (_, task_id, _) in waiting])
+		checkpoint.column("waiting_tasks/priority", "q", [key[0] for (_, _, key) in waiting])
+		checkpoint.column("waiting_tasks/sequence", "q", [key[1] for (_, _, key) in waiting])
+		checkpoint.column("assigned_tasks/element", "q", [checkpoint.element_row(task) for (task, _, _) in self.assigned_tasks.values()])
+		checkpoint.column("assigned_tasks/resource", "q", [resource_row(resource) for (_, resource, _) in self.assigned_tasks.values()])
+		checkpoint.numbers("assigned_tasks/moment", [moment for (_, _, moment) in self.assigned_tasks.values()])
+		# the resources
+		checkpoint.column("available_resources", "q", [resource_row(resource) for resource in self.available_resources])
+		checkpoint.column("free_resources", "q", [resource_row(resource) for resources in self.free_resources.values() for resource in resources])
+		checkpoint.column("away_resources", "q", [resource_row(resource) for resource in self.away_resources])
+		checkpoint.column("busy_resources/resource", "q", [resource_row(resource) for resource in self.busy_resources])
+		checkpoint.column("busy_resources/element", "q", [checkpoint.element_row(task) for (task, _) in self.busy_resources.values()])
+		checkpoint.numbers("busy_resources/moment", [moment for (_, moment) in self.busy_resources.values()])
+		checkpoint.numbers("availability_changes/moment", self.availability_changes.keys())
+		checkpoint.column("availability_changes/count", "q", [len(resources) for resources in self.availability_changes.values()])
+		checkpoint.column("availability_changes/resource", "q", [resource_row(resource) for resources in self.availability_changes.values() for resource in resources])
+		# the cases
+		checkpoint.column("busy_cases/case_id", "q", self.busy_cases.keys())
+		checkpoint.column("busy_cases/count", "q", [len(element_ids) for element_ids in self.busy_cases.values()])
+		checkpoint.column("busy_cases/element_id", "q", [element_id for element_ids in self.busy_cases.values() for element_id in element_ids])
+		checkpoint.column("case_start_times/case_id", "q", self.case_start_times.keys())
+		checkpoint.numbers("case_start_times/moment", self.case_start_times.values())
+		checkpoint.column("task_start_end_times/element", "q", [checkpoint.element_row(task) for task in self.task_start_end_times])
+		checkpoint.numbers("task_start_end_times/start", [start for (start, _) in self.task_start_end_times.values()])
+		checkpoint.numbers("task_start_end_times/end", [end for (_, end) in self.task_start_end_times.values()])
+		checkpoint.column("event_times/element", "q", [checkpoint.element_row(event) for event in self.event_times])
+		checkpoint.numbers("event_times/moment", self.event_times.values())
+		self.problem.write_checkpoint(checkpoint)
+		checkpoint.write(filename, self.problem.case_data)
+
+	@classmethod
+	def from_checkpoint(cls, filename, planner):
+		"""
+		Returns a simulator in the state that was written to the file with save_checkpoint.
+		:param planner: the planner of the restored simulator.
+		"""
+		checkpoint = CheckpointReader(filename)
+		state = checkpoint.document("simulator")
+		problem = load_class(state["problem_class"]).from_checkpoint(checkpoint)
+		if [resource.id for resource in problem.resources] != state["resources"]:
+			raise ValueError("The resources of the problem do not match the resources in the checkpoint.")
+		checkpoint.read_elements(Element, problem.case_data)
+		resources = problem.resources
+		def resource(row):
+			return None if row == -1 else resources[row]
+		simulator = cls.__new__(cls)
+		simulator.coalesce = state["coalesce"]
+		simulator.keep_history = state["keep_history"]
+		simulator.now = state["now"]
+		simulator.finalized_cases = state["finalized_cases"]
+		simulator.total_cycle_time = state["total_cycle_time"]
+		simulator.tasks_queued = state["tasks_queued"]
+		# the event queue
+		simulator.events = CoalescingEventQueue() if simulator.coalesce else EventQueue()
+		columns = zip(checkpoint.numbers("events/moment"), checkpoint.column("events/priority"), checkpoint.column("events/sequence"), checkpoint.coded("events/event_type"),
+					  checkpoint.numbers("events/event_moment"), checkpoint.column("events/element"), checkpoint.column("events/resource"))
+		simulator.events.heap = [(moment, priority, sequence, SimulationEvent(event_type, event_moment, checkpoint.element(element_row), resource(resource_row)))
+								 for (moment, priority, sequence, event_type, event_moment, element_row, resource_row) in columns]
+		entries = {entry[2]: entry for entry in simulator.events.heap}
+		simulator.events.sequence = state["sequence"]
+		simulator.events.live = state["live"]
+		simulator.events.cancelled = set(checkpoint.column("events/cancelled"))
+		for sequence in checkpoint.column("events/indexed"):
+			element = entries[sequence][3].element
+			simulator.events.index[(element.case_id, element.label)] = entries[sequence]
+		if simulator.coalesce:
+			for event_type, sequence in zip(checkpoint.coded("events/pending/event_type"), checkpoint.column("events/pending/sequence")):
+				simulator.events.pending[event_type] = (entries[sequence][0], entries[sequence][3])
+			simulator.events.coalesced = dict(zip(checkpoint.coded("events/coalesced/event_type"), checkpoint.column("events/coalesced/count")))
+		# the tasks
+		simulator.unassigned_tasks = dict()
+		for row in checkpoint.column("unassigned_tasks"):
+			task = checkpoint.element(row)
+			simulator.unassigned_tasks[task.id] = task
+		simulator.waiting_tasks = dict()
+		for resource_type, row, priority, sequence in zip(checkpoint.coded("waiting_tasks/resource_type"), checkpoint.column("waiting_tasks/element"),
+														  checkpoint.column("waiting_tasks/priority"), checkpoint.column("waiting_tasks/sequence")):
+			if resource_type not in simulator.waiting_tasks:
+				simulator.waiting_tasks[resource_type] = TaskQueue()
+			simulator.waiting_tasks[resource_type].add(checkpoint.element(row), priority, sequence)
+		simulator.assigned_tasks = dict()
+		for row, resource_row, moment in zip(checkpoint.column("assigned_tasks/element"), checkpoint.column("assigned_tasks/resource"), checkpoint.numbers("assigned_tasks/moment")):
+			task = checkpoint.element(row)
+			simulator.assigned_tasks[task.id] = (task, resource(resource_row), moment)
+		# the resources
+		simulator.available_resources = {resource(row) for row in checkpoint.column("available_resources")}
+		simulator.free_resources = {r.type: dict() for r in resources}
+		for row in checkpoint.column("free_resources"):
+			simulator.free_resources[resource(row).type][resource(row)] = None
+		simulator.away_resources = [resource(row) for row in checkpoint.column("away_resources")]
+		simulator.away_counts = {r.type: 0 for r in resources}
+		simulator.resource_totals = {r.type: 0 for r in resources}
+		for r in resources:
+			simulator.resource_totals[r.type] += 1
+		for r in simulator.away_resources:
+			simulator.away_counts[r.type] += 1
+		simulator.busy_resources = dict()
+		for resource_row, row, moment in zip(checkpoint.column("busy_resources/resource"), checkpoint.column("busy_resources/element"), checkpoint.numbers("busy_resources/moment")):
+			simulator.busy_resources[resource(resource_row)] = (checkpoint.element(row), moment)
+		rows = iter(checkpoint.column("availability_changes/resource"))
+		simulator.availability_changes = dict()
+		for moment, count in zip(checkpoint.numbers("availability_changes/moment"), checkpoint.column("availability_changes/count")):
+			simulator.availability_changes[moment] = [resource(next(rows)) for _ in range(count)]
+		# the cases
+		element_ids = iter(checkpoint.column("busy_cases/element_id"))
+		simulator.busy_cases = dict()
+		for case_id, count in zip(checkpoint.column("busy_cases/case_id"), checkpoint.column("busy_cases/count")):
+			simulator.busy_cases[case_id] = {next(element_ids) for _ in range(count)}
+		simulator.case_start_times = dict(zip(checkpoint.column("case_start_times/case_id"), checkpoint.numbers("case_start_times/moment")))
+		simulator.task_start_end_times = dict()
+		for row, start, end in zip(checkpoint.column("task_start_end_times/element"), checkpoint.numbers("task_start_end_times/start"), checkpoint.numbers("task_start_end_times/end")):
+			simulator.task_start_end_times[checkpoint.element(row)] = (start, end)
+		simulator.event_times = {checkpoint.element(row): moment for row, moment in zip(checkpoint.column("event_times/element"), checkpoint.numbers("event_times/moment"))}
+		simulator.problem = problem
+		simulator.planner = planner
+		problem.set_simulator(simulator)
+		planner.set_planner_helper(PlannerHelper(problem, simulator))
+		problem.track_can_plan_changes(isinstance(planner, IncrementalPlanner))
+		return simulator
+
+	def coalesced_passes(self):
+		"""
+		Returns a dictionary of pass event type -> number of redundant passes that were merged into a pending pass, which is empty if coalescing is off.
+		"""
+		if self.coalesce:
+			return dict(self.events.coalesced)
+		return dict()
 
 	def is_planning_slot(self, time):
 		"""
 		Returns whether the given time is the time of a planning slot.
 		There are planning slots every half hour between 8:00 and 15:00 (inclusive) on weekdays.
 		"""
-		time_in_week = time % (24 * 7)
-		hour_of_day_x_10 = round((time_in_week % 24)*10)  # we multiply by 10 to avoid floating point errors
-		#day_of_week = round(time_in_week // 24)  # 0 is Monday, 1 is Tuesday, ..., 6 is Sunday
-		day_of_week = True
-		return hour_of_day_x_10 >= 80 and hour_of_day_x_10 <= 150 and day_of_week < 5 and hour_of_day_x_10 % 5 == 0
+		# the day of the week is not checked, so in fact there are planning slots on every day
+		return round((time % 24) * 10) in self.PLANNING_SLOTS_X_10  # we multiply by 10 to avoid floating point errors
+
+	def next_planning_slot(self, time):
+		"""
+		Returns the first planning slot at or after the given time.
+		"""
+		return self.PLANNING_SLOTS.next_moment(time)
 
 	def activate(self, element):
 		"""
@@ -129,130 +578,144 @@ class Simulator:
 		For an event that means scheduling the completion of the event for the moment at which it happens.
 		For a task that means scheduling the assignment of resources immediately.
 		"""
-		self.busy_cases[element.case_id].append(element)
+		self.busy_cases[element.case_id].add(element.id)
 		if element.is_event():
 			self.planner.report(element.case_id, element, self.now, None, EventType.ACTIVATE_EVENT)
-			self.events.append((element.occurrence_time, SimulationEvent(EventType.COMPLETE_EVENT, element.occurrence_time, element)))
+			self.events.push(element.occurrence_time, SimulationEvent(EventType.COMPLETE_EVENT, element.occurrence_time, element))
 		elif element.is_task():
 			self.planner.report(element.case_id, element, self.now, None, EventType.ACTIVATE_TASK)
-			self.unassigned_tasks[element.id] = element
-			self.events.append((self.now, SimulationEvent(EventType.ASSIGN_RESOURCES, self.now, None)))
-		self.events.append((self.now, SimulationEvent(EventType.PLAN_EVENTS, self.now, None)))
+			self.add_unassigned_task(element)
+			self.events.push(self.now, SimulationEvent(EventType.ASSIGN_RESOURCES, self.now, None))
+		self.events.push(self.now, SimulationEvent(EventType.PLAN_EVENTS, self.now, None))
 
 	def run(self, running_time=24*365):
 		"""
 		Runs the simulation for the specified amount of time.
 		"""
 		while self.now <= running_time:
-			(self.now, event) = self.events.pop(0)
+			(self.now, event) = self.events.pop()
 
 			if event.event_type == EventType.CASE_ARRIVAL:				
 				self.planner.report(event.element.case_id, None, self.now, None, EventType.CASE_ARRIVAL)  # report CASE_ARRIVAL
 				# create the case
 				self.case_start_times[event.element.case_id] = self.now
-				self.busy_cases[event.element.case_id] = []
+				self.busy_cases[event.element.case_id] = set()
 				# activate the first element
 				self.activate(event.element)
 				# schedule the next case arrival
 				(t, task) = self.problem.next_case()
-				self.events.append((t, SimulationEvent(EventType.CASE_ARRIVAL, t, task)))
+				if task is not None:
+					self.events.push(t, SimulationEvent(EventType.CASE_ARRIVAL, t, task))
 
 			elif event.event_type == EventType.START_TASK:
-				self.task_start_end_times[event.element] = [self.now, 0]
+				if self.keep_history:
+					self.task_start_end_times[event.element] = (self.now, 0)
 				self.planner.report(event.element.case_id, event.element, self.now, event.resource, EventType.START_TASK) # report START_TASK
 				self.problem.start_task(event.element)
 				# start the task
 				self.busy_resources[event.resource] = (event.element, self.now)
 				# schedule the completion of the task
 				t = self.now + self.problem.processing_time_sample(event.resource, event.element, self.now)
-				self.events.append((t, SimulationEvent(EventType.COMPLETE_TASK, t, event.element, event.resource)))				
+				self.events.push(t, SimulationEvent(EventType.COMPLETE_TASK, t, event.element, event.resource))				
 
 			elif event.event_type == EventType.COMPLETE_EVENT \
 			  		or event.event_type == EventType.COMPLETE_TASK:
 				self.planner.report(event.element.case_id, event.element, self.now, event.resource, event.event_type) # report COMPLETE_EVENT or COMPLETE_TASK
 				# for tasks, process the resource that performed the task
 				if event.event_type == EventType.COMPLETE_TASK:
-					self.task_start_end_times[event.element][1] = self.now
+					if self.keep_history:
+						self.task_start_end_times[event.element] = (self.task_start_end_times[event.element][0], self.now)
 					del self.busy_resources[event.resource]
 					if self.problem.resources_available(event.resource, self.now):
-						self.available_resources.add(event.resource)
-						self.events.append((self.now, SimulationEvent(EventType.ASSIGN_RESOURCES, self.now, None)))  # if a resource becomes available, it can be assigned, so we schedule the assignment of resources
+						self.add_available_resource(event.resource)
+						self.events.push(self.now, SimulationEvent(EventType.ASSIGN_RESOURCES, self.now, None))  # if a resource becomes available, it can be assigned, so we schedule the assignment of resources
 					else:
-						self.away_resources.append(event.resource)
+						self.add_away_resource(event.resource)
 					del self.assigned_tasks[event.element.id]
-				else:
+				elif self.keep_history:
 					self.event_times[event.element] = self.now
 
 				# complete the element
-				self.busy_cases[event.element.case_id] = list(filter(
-					lambda k : k.id != event.element.id,
-					self.busy_cases[event.element.case_id]
-				))
+				self.busy_cases[event.element.case_id].discard(event.element.id)
 				next_elements = self.problem.complete_element(event.element)
 				# activate the next elements
 				for next_element in next_elements:  
 					self.activate(next_element)
 				# if the case is done, complete the case
-				if len(self.busy_cases[event.element.case_id]) == 0:					
-					self.events.append((self.now, SimulationEvent(EventType.COMPLETE_CASE, self.now, event.element)))
+				if not self.busy_cases[event.element.case_id]:
+					self.events.push(self.now, SimulationEvent(EventType.COMPLETE_CASE, self.now, event.element))
 
 			elif event.event_type == EventType.SCHEDULE_RESOURCES:
+				# only the resources of which the availability changes now are checked
+				changing_resources = self.availability_changes.pop(self.now)
+				changing = set(changing_resources)
 				# check if resources become available again and make them available if that is the case
 				resources_to_add = []
 				for resource in self.away_resources:
-					if self.problem.resources_available(resource, self.now):
+					if resource in changing and self.problem.resources_available(resource, self.now):
 						resources_to_add.append(resource)
 				for resource in resources_to_add:
-					self.away_resources.remove(resource)
-					self.available_resources.add(resource)
+					self.remove_away_resource(resource)
+					self.add_available_resource(resource)
 				if len(resources_to_add) > 0:
-					self.events.append((self.now, SimulationEvent(EventType.ASSIGN_RESOURCES, self.now, None)))  # if a resource becomes available, it can be assigned, so we schedule the assignment of resources
+					self.events.push(self.now, SimulationEvent(EventType.ASSIGN_RESOURCES, self.now, None))  # if a resource becomes available, it can be assigned, so we schedule the assignment of resources
 				# check if resources leave and send them away if that is the case
 				resources_to_remove = []
-				for resource in self.available_resources:
-					if not self.problem.resources_available(resource, self.now):
+				for resource in changing_resources:
+					if resource in self.available_resources and not self.problem.resources_available(resource, self.now):
 						resources_to_remove.append(resource)
 				for resource in resources_to_remove:
-					self.available_resources.remove(resource)
-					self.away_resources.append(resource)
-				# schedule the next resource check
-				self.events.append((self.now + 1, SimulationEvent(EventType.SCHEDULE_RESOURCES, self.now + 1, None)))
+					self.remove_available_resource(resource)
+					self.add_away_resource(resource)
+				# schedule the next change of each of the resources, busy resources are checked when they complete their task
+				for resource in changing_resources:
+					self.schedule_availability_change(resource)
 
 			elif event.event_type == EventType.ASSIGN_RESOURCES:
 				# assign resources to tasks
 				if len(self.unassigned_tasks) > 0 and len(self.available_resources) > 0:
-					assignments = self.problem.assign_resources(self.unassigned_tasks, self.available_resources)
+					assignments = self.problem.assign_resources(self.waiting_tasks, self.free_resources)  # removes the assigned resources from the free pools
+					# start the tasks in the order of their queues, as if all tasks waited in a single queue
+					assignments.sort(key=lambda assignment: self.waiting_tasks[assignment[1].type].key(assignment[0].id))
 					for (task, resource) in assignments:
-						self.events.append((self.now, SimulationEvent(EventType.START_TASK, self.now, task, resource)))
+						self.events.push(self.now, SimulationEvent(EventType.START_TASK, self.now, task, resource))
 						del self.unassigned_tasks[task.id]
+						self.waiting_tasks[resource.type].remove(task.id)
 						self.assigned_tasks[task.id] = (task, resource, self.now)
 						self.available_resources.remove(resource)
 
 			elif event.event_type == EventType.REGULAR_PLANNING_MOMENT:
 				# schedule event planning for now
-				self.events.append((self.now, SimulationEvent(EventType.PLAN_EVENTS, self.now, None)))
+				self.events.push(self.now, SimulationEvent(EventType.PLAN_EVENTS, self.now, None))
 				# schedule the next regular planning moment
 				next_planning_moment = self.problem.next_regular_planning_moment(self.now)
-				self.events.append((next_planning_moment, SimulationEvent(EventType.REGULAR_PLANNING_MOMENT, next_planning_moment, None)))
+				self.events.push(next_planning_moment, SimulationEvent(EventType.REGULAR_PLANNING_MOMENT, next_planning_moment, None))
 
 			elif event.event_type == EventType.PLAN_EVENTS:				
 				# plan events
-				# is done each time an element is activated and there are events to plan
-				if len(self.problem.can_plan)>0:
+				# is done each time an element is activated and there are events to plan,
+				# and for an incremental planner also when there are changes to pass on, e.g. the removal of the last event to plan
+				planned_events = []
+				if self.problem.can_plan_changes is not None:
+					(added, removed) = self.problem.take_can_plan_changes()
+					if len(self.problem.can_plan) > 0 or len(added) > 0 or len(removed) > 0:
+						planned_events = self.planner.plan_changes(added, removed, self.now)
+				elif len(self.problem.can_plan)>0:
 					planned_events = self.planner.plan(self.problem.can_plan, self.now)
-					for planned_element in planned_events:
-						created_events = self.problem.plan(planned_element[0], planned_element[1], planned_element[2])
-						for created_event in created_events:
-							if not created_event.is_event():
-								raise ValueError("At this stage, we only allow for planning of events.")
-							self.activate(created_event)
+				for planned_element in planned_events:
+					created_events = self.problem.plan(planned_element[0], planned_element[1], planned_element[2])
+					for created_event in created_events:
+						if not created_event.is_event():
+							raise ValueError("At this stage, we only allow for planning of events.")
+						self.activate(created_event)
 
 			elif event.event_type == EventType.COMPLETE_CASE:
 				self.planner.report(event.element.case_id, None, self.now, None, EventType.COMPLETE_CASE)  # report COMPLETE_CASE
 				self.total_cycle_time += self.now - self.case_start_times[event.element.case_id]
+				if not self.keep_history:
+					del self.case_start_times[event.element.case_id]
 				self.finalized_cases += 1
 				del self.busy_cases[event.element.case_id]
-			self.sort_events()
 
 		score = self.problem.evaluate()
 		return score
\ No newline at end of file
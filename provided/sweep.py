@@ -0,0 +1,107 @@
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+from replications import run_replication
+
+
+def expand_grid(grid):
+    """
+    Returns the points of a parameter grid.
+    :param grid: a dictionary of parameter name -> list of values of the parameter.
+    :return: a list of dictionaries of parameter name -> value, one for each combination of values, in the order of the grid.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def job_key(name, params, seed, running_time):
+    """
+    Returns the key of the result of a planner with the given parameters on the replication with the given seed,
+    which is a hash of the name of the planner, the parameters, the seed and the running time.
+    """
+    job = {"planner": name, "params": params, "seed": seed, "running_time": running_time}
+    return hashlib.sha256(json.dumps(job, sort_keys=True).encode()).hexdigest()
+
+
+def run_job(planner_factory, params, seed, running_time):
+    return run_replication(partial(planner_factory, **params), seed, running_time)
+
+
+def run_sweep(planner_factory, grid, replications=1, running_time=365*24, seed=0, cache_dir="sweep_cache", processes=None, name=None):
+    """
+    Evaluates a planner for every point of a parameter grid on independently seeded replications, in parallel,
+    and caches the result of each (point, seed) job in a file in the cache directory.
+    Jobs of which the result is cached are not run again, so re-running a sweep, or extending its grid, only runs the missing jobs.
+    The cache does not know the code of the planner and the simulator, so it must be cleared, or another name must be used, when that code changes.
+    :param planner_factory: a picklable callable that returns a new planner for the keyword arguments of a point of the grid, e.g. a planner class.
+        The planner must not write to shared files, because jobs run concurrently.
+    :param grid: a dictionary of parameter name -> list of values of the parameter, see expand_grid. The values must be JSON values.
+    :param replications: the number of replications per point. Replication i is seeded with seed + i, as in run_replications,
+        so all points are compared on the same arrivals, case types and diagnoses.
+    :param running_time: the simulated time in hours of each replication.
+    :param seed: the seed of the first replication.
+    :param cache_dir: the directory with the cached results, which is created if it does not exist.
+    :param processes: the number of worker processes, by default the number of CPUs.
+    :param name: the name of the planner in the cache keys, by default the module and name of the planner factory.
+    :return: a list of (point, results) tuples in the order of the grid, where results is a list with the result of HealthcareProblem.evaluate()
+        for each replication, in the order of the seeds. The results of a point can be aggregated with replications.summarize.
+    """
+    if name is None:
+        name = planner_factory.__module__ + "." + planner_factory.__qualname__
+    os.makedirs(cache_dir, exist_ok=True)
+    points = expand_grid(grid)
+    seeds = [seed + i for i in range(replications)]
+    results = dict()  # dictionary of job key -> result
+    missing = dict()  # dictionary of job key -> (point, seed) of the jobs of which the result is not cached
+    for point in points:
+        for s in seeds:
+            key = job_key(name, point, s, running_time)
+            if key in results or key in missing:
+                continue
+            cached = read_cached_result(cache_dir, key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                missing[key] = (point, s)
+    if processes is None:
+        processes = os.cpu_count()
+    processes = min(processes, len(missing))
+    if processes <= 1:
+        for key, (point, s) in missing.items():
+            results[key] = run_job(planner_factory, point, s, running_time)
+            write_cached_result(cache_dir, key, name, point, s, running_time, results[key])
+    elif len(missing) > 0:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {executor.submit(run_job, planner_factory, point, s, running_time): key for key, (point, s) in missing.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                (point, s) = missing[key]
+                results[key] = future.result()
+                write_cached_result(cache_dir, key, name, point, s, running_time, results[key])
+    return [(point, [results[job_key(name, point, s, running_time)] for s in seeds]) for point in points]
+
+
+def read_cached_result(cache_dir, key):
+    """
+    Returns the cached result of the job with the given key, or None if it is not cached.
+    """
+    try:
+        with open(os.path.join(cache_dir, key + ".json")) as file:
+            return json.load(file)["result"]
+    except FileNotFoundError:
+        return None
+
+
+def write_cached_result(cache_dir, key, name, params, seed, running_time, result):
+    """
+    Writes the result of a job to the cache, together with the job, so that the cache can be inspected.
+    The file is written under a temporary name and then renamed, so that an interrupted sweep does not leave a partial result.
+    """
+    file_name = os.path.join(cache_dir, key + ".json")
+    with open(file_name + ".tmp", "w") as file:
+        json.dump({"planner": name, "params": params, "seed": seed, "running_time": running_time, "result": result}, file)
+    os.replace(file_name + ".tmp", file_name)
@@ -0,0 +1,19 @@
+from arrivaltrace import ArrivalTrace
+
+
+def test_close_after_partial_iteration(tmp_path):
+    filename = str(tmp_path / "trace.bin")
+    ArrivalTrace.write(filename, [(1.0, "A", "A1"), (2.0, "EM", None), (3.0, "B", "B2")])
+    trace = ArrivalTrace(filename)
+    iterator = iter(trace)
+    assert next(iterator) == (1.0, "A", "A1")
+    trace.close()
+
+
+def test_iteration_matches_indexing(tmp_path):
+    filename = str(tmp_path / "trace.bin")
+    arrivals = [(1.0, "A", "A1"), (2.0, "EM", None), (3.0, "B", "B2")]
+    ArrivalTrace.write(filename, arrivals)
+    trace = ArrivalTrace(filename)
+    assert list(trace) == arrivals == [trace[i] for i in range(len(trace))]
+    trace.close()
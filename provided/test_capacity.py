@@ -0,0 +1,9 @@
+import pytest
+
+from __random__ import NaivePlanner
+from capacity import plan_capacity
+
+
+def test_rejects_budget_below_initial_replications():
+    with pytest.raises(ValueError):
+        plan_capacity(NaivePlanner, {"A_BED": [25, 30, 35]}, {"processed_score": 1500}, initial_replications=10, budget=20, processes=1)
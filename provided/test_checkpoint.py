@@ -0,0 +1,20 @@
+from __benchmark__ import BenchmarkPlanner
+from problems import HealthcareProblem
+from simulator import Simulator
+
+
+def test_restored_elements_share_the_data_of_their_case(tmp_path):
+    simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=1))
+    simulator.run(500)
+    filename = str(tmp_path / "checkpoint.bin")
+    simulator.save_checkpoint(filename)
+    restored = Simulator.from_checkpoint(filename, BenchmarkPlanner())
+    case_data = restored.problem.case_data
+    elements = [event.element for (_, event) in restored.events if event.element is not None]
+    assert len(elements) > 0
+    for element in elements:
+        if element.case_id in case_data:
+            assert element.data is case_data[element.case_id]
+        else:
+            assert element.data == dict()
+    assert restored.run(1000) == simulator.run(1000)
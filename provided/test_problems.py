@@ -0,0 +1,51 @@
+import copy
+
+import pytest
+
+from __benchmark__ import SlotPlanner
+from problems import HealthcareProblem, ResourceType
+from simulator import Simulator
+
+
+def create_problem(configuration=None):
+    problem = HealthcareProblem(seed=1, configuration=configuration)
+    Simulator(SlotPlanner(), problem)
+    return problem
+
+
+def test_next_free_planning_slot_rejects_zero_capacity():
+    problem = create_problem()
+    with pytest.raises(ValueError):
+        problem.next_free_planning_slot(10, ResourceType.INTAKE, 0)
+
+
+def test_next_free_planning_slot_rejects_configuration_without_intake_staff():
+    configuration = copy.deepcopy(HealthcareProblem.CONFIGURATION)
+    configuration["resources"]["INTAKE"] = 0
+    problem = create_problem(configuration)
+    with pytest.raises(ValueError):
+        problem.next_free_planning_slot(10, ResourceType.INTAKE)
+
+
+def test_next_free_planning_slot_returns_none_when_the_week_is_full():
+    problem = create_problem()
+    slot = problem.simulator.next_planning_slot(10)
+    for _ in range(7 * len(problem.simulator.PLANNING_SLOTS.moments)):
+        problem.planning_slot_usage[(round(slot * 10), ResourceType.INTAKE)] = [0]
+        slot = problem.simulator.PLANNING_SLOTS.next_moment(slot, after=True)
+    assert problem.next_free_planning_slot(10, ResourceType.INTAKE, 1) is None
+    assert problem.next_free_planning_slot(10, ResourceType.INTAKE, 2) == 10
+
+
+def test_partial_resource_configuration_keeps_default_counts():
+    configuration = copy.deepcopy(HealthcareProblem.CONFIGURATION)
+    configuration["resources"] = {"OR": 3}
+    problem = HealthcareProblem(seed=1, configuration=configuration)
+    counts = {resource_type: 0 for resource_type in ResourceType}
+    for resource in problem.resources:
+        counts[resource.type] += 1
+    assert counts[ResourceType.OR] == 3
+    assert counts[ResourceType.INTAKE] == HealthcareProblem.CONFIGURATION["resources"]["INTAKE"]
+    scaled = HealthcareProblem.scale_configuration(configuration, resources=2)
+    assert scaled["resources"]["OR"] == 6
+    assert scaled["resources"]["A_BED"] == 2 * HealthcareProblem.CONFIGURATION["resources"]["A_BED"]
@@ -0,0 +1,14 @@
+import math
+
+from replications import summarize
+
+
+def test_single_replication_has_no_confidence_interval():
+    summary = summarize([{"processed_score": 10.0}])["processed_score"]
+    assert summary["n"] == 1 and summary["mean"] == 10.0
+    assert math.isnan(summary["std"]) and math.isnan(summary["ci_low"]) and math.isnan(summary["ci_high"])
+
+
+def test_confidence_interval_contains_mean():
+    summary = summarize([{"processed_score": 10.0}, {"processed_score": 12.0}])["processed_score"]
+    assert summary["ci_low"] < summary["mean"] == 11.0 < summary["ci_high"]
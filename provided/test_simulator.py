@@ -0,0 +1,67 @@
+import pytest
+
+from __benchmark__ import BenchmarkPlanner
+from planners import IncrementalPlanner
+from problems import HealthcareProblem
+from simulator import Simulator
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_coalescing_does_not_change_results(seed):
+    results = []
+    for coalesce in [False, True]:
+        simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=seed), coalesce=coalesce)
+        results.append(simulator.run(30 * 24))
+    assert sum(simulator.coalesced_passes().values()) > 0
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_fork_and_checkpoint_continue_like_an_uninterrupted_run(seed, tmp_path):
+    horizon = 30 * 24
+    expected = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=seed)).run(horizon)
+    for moment in [100, 333.3]:
+        simulator = Simulator(BenchmarkPlanner(), HealthcareProblem(seed=seed))
+        simulator.run(moment)
+        fork = simulator.fork(BenchmarkPlanner())
+        filename = str(tmp_path / "checkpoint.bin")
+        simulator.save_checkpoint(filename)
+        restored = Simulator.from_checkpoint(filename, BenchmarkPlanner())
+        assert fork.run(horizon) == expected
+        assert restored.run(horizon) == expected
+        assert simulator.run(horizon) == expected
+
+
+class ImmediateIncrementalPlanner(IncrementalPlanner):
+    """
+    Plans every element as soon as it can be planned, so that the elements that it planned are removed while nothing else can be planned,
+    and checks that the changes it is told about add up to the plannable elements.
+    """
+    def __init__(self):
+        super().__init__()
+        self.plannable = set()  # (case_id, element_label) of the elements that are plannable according to the changes
+        self.calls = 0
+        self.removal_only_calls = 0
+
+    def plan_changes(self, added, removed, simulation_time):
+        self.plannable.update(added)
+        self.plannable.difference_update(removed)
+        snapshot = {(case_id, element_label) for case_id, element_labels in self.planner_helper.plannable_elements().items() for element_label in element_labels}
+        assert self.plannable == snapshot
+        self.calls += 1
+        if len(added) == 0:
+            self.removal_only_calls += 1
+        return [(case_id, element_label, simulation_time + 24) for (case_id, element_label) in added]
+
+
+def test_plan_changes_add_up_to_the_plannable_elements():
+    planner = ImmediateIncrementalPlanner()
+    simulator = Simulator(planner, HealthcareProblem(seed=1))
+    simulator.run(30 * 24)
+    assert planner.calls > 0
+    # the removal of the last plannable element is passed on, although nothing can be planned after it
+    assert planner.removal_only_calls > 0
+    (added, removed) = simulator.problem.take_can_plan_changes()
+    planner.plannable.update(added)
+    planner.plannable.difference_update(removed)
+    assert planner.plannable == {(case_id, element_label) for case_id, element_labels in simulator.problem.can_plan.items() for element_label in element_labels}
@@ -0,0 +1,31 @@
+import copy
+import random
+
+import pytest
+
+from __tabusearch__ import TabusearchPlanner
+from problems import HealthcareProblem
+from simulator import Simulator
+
+
+def test_rejects_zero_slot_capacity():
+    with pytest.raises(ValueError):
+        TabusearchPlanner(slot_capacity=0)
+
+
+def test_plans_nothing_without_intake_staff():
+    configuration = copy.deepcopy(HealthcareProblem.CONFIGURATION)
+    configuration["resources"]["INTAKE"] = 0
+    problem = HealthcareProblem(seed=1, configuration=configuration)
+    simulator = Simulator(TabusearchPlanner(), problem)
+    simulator.run(3 * 24)
+    assert len(problem.planning_slot_usage) == 0
+
+
+def test_seeded_random_module_reproduces_plans():
+    results = []
+    for _ in range(2):
+        random.seed(3)
+        simulator = Simulator(TabusearchPlanner(candidate_moves=1), HealthcareProblem(seed=1))
+        results.append(simulator.run(30 * 24))
+    assert results[0] == results[1]